@@ -4,21 +4,110 @@ Python Tic-tac-toe Game
 
 # Imported Functions
 
-import pygame
+import argparse
+import atexit
+import json
 import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Tuple, Optional
 
-Position = Tuple[int, int]
+from tictactoe import Position, Initialise, Result, SolvedTable, TranspositionTable, MoveCache, GameTree, Dataset, MCTS, AI, aiHelper, GameRecord, RecordWriter, Simulation, Tournament, Benchmark
+from server import GameServer, GameClient
+
+# Imported on first use so headless commands never load pygame or need a display.
+pygame = None
+
+def loadPygame():
+    """ Import and start pygame the first time a window is needed. """
+    
+    global pygame
+    
+    if pygame is None:
+        
+        import pygame
+        pygame.init()
+        pygame.font.init()
+        
+    return pygame
+
+class Fonts:
+    """ System fonts looked up once and shared by every menu and GUI. """
+    
+    paths: Dict[str, Optional[str]] = {}
+    loaded: Dict[Tuple[str, int], object] = {}
+    
+    def get(name: str, size: int):
+        """ Return a font, searching the system fonts for its file only the first time a name is asked for. """
+        
+        font = Fonts.loaded.get((name, size))
+        
+        if font is None:
+            
+            if name not in Fonts.paths: Fonts.paths[name] = pygame.font.match_font(name)
+            font = Fonts.loaded[(name, size)] = pygame.font.Font(Fonts.paths[name], size)
+            
+        return font
+
+class SurfaceCache:
+    """ Bounded LRU cache of pre-rendered surfaces with hit and miss counts. """
+    
+    def __init__(self, maxSize: int = 256):
+        
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[tuple, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    def __len__(self) -> int:
+        
+        return len(self.entries)
+        
+    def get(self, key: tuple, make):
+        """ Return the cached surface for a key, rendering it with make() on a miss. """
+        
+        surface = self.entries.get(key)
+        
+        if surface is None:
+            
+            self.misses += 1
+            surface = self.entries[key] = make()
+            if len(self.entries) > self.maxSize: self.entries.popitem(last=False)
+            
+        else:
+            
+            self.hits += 1
+            self.entries.move_to_end(key)
+            
+        return surface
+    
+    def text(self, font, text: str, colour) -> "pygame.Surface":
+        """ Return the rendered surface for some text in a font and colour. """
+        
+        return self.get(("text", font, text, colour), lambda: font.render(text, True, colour))
+    
+    def clear(self):
+        """ Empty the cache and reset the counters. """
+        
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+# One cache shared by every screen so labels survive going back to the menu.
+surfaceCache = SurfaceCache()
 
 class Menu():
     
     def __init__(self, screen, screenDimensions: Position):
         
         self.screen = screen
+        self.cache = surfaceCache
         self.screenDimensions = screenDimensions
         self.buttonDimensions = (400, 70)
         self.buttonColours = {"menu": (200, 200, 200), "text": (0, 0, 0), "outline": (0, 0, 0), "button": (100, 150, 0), "hover":(150, 0, 150)}
-        self.font = {"small": pygame.font.SysFont('Corbel', 35), "large": pygame.font.SysFont('Corbel', 60), "title": pygame.font.SysFont('Corbel', 80)}
+        self.font = {"small": Fonts.get('Corbel', 35), "large": Fonts.get('Corbel', 60), "title": Fonts.get('Corbel', 80)}
         self.running = True
         self.mode = None
         self.difficultyLevel = None
@@ -31,14 +120,30 @@ class Menu():
         rectangle = pygame.Rect(left, top, self.buttonDimensions[0], self.buttonDimensions[1])
         
         if outline: 
-            colour = self.buttonColours["hover"] if rectangle.collidepoint(pygame.mouse.get_pos()) else self.buttonColours["button"]
-            pygame.draw.rect(self.screen, colour, rectangle)
-            pygame.draw.rect(self.screen, self.buttonColours["outline"], rectangle, 3)
-        
-        surface = self.font[fontSize].render(text, True, self.buttonColours["text"])
-        self.screen.blit(surface, surface.get_rect(center=position))
+            normal, hover = self.cache.get(("menu", text, self.font[fontSize]), lambda: self.bakeButton(text, fontSize))
+            self.screen.blit(hover if rectangle.collidepoint(pygame.mouse.get_pos()) else normal, rectangle)
+            
+        else:
+            surface = self.cache.text(self.font[fontSize], text, self.buttonColours["text"])
+            self.screen.blit(surface, surface.get_rect(center=position))
         
         return rectangle
+    
+    def bakeButton(self, text: str, fontSize: str):
+        """ Render a button's normal and hover surfaces together. """
+        
+        surfaces = []
+        label = self.font[fontSize].render(text, True, self.buttonColours["text"])
+        
+        for colour in (self.buttonColours["button"], self.buttonColours["hover"]):
+            
+            surface = pygame.Surface(self.buttonDimensions)
+            surface.fill(colour)
+            pygame.draw.rect(surface, self.buttonColours["outline"], surface.get_rect(), 3)
+            surface.blit(label, label.get_rect(center=surface.get_rect().center))
+            surfaces.append(surface)
+            
+        return tuple(surfaces)
         
     def run(self):
         
@@ -90,6 +195,7 @@ class Menu():
             easyButton = self.drawText("Easy", (self.screenDimensions[0]//2, 350), "large", True)
             mediumButton = self.drawText("Medium", (self.screenDimensions[0]//2, 425), "large", True)
             hardButton = self.drawText("Hard", (self.screenDimensions[0]//2, 500), "large", True)
+            mctsButton = self.drawText("MCTS", (self.screenDimensions[0]//2, 575), "large", True)
             backButton = self.drawText("Back", (self.screenDimensions[0]//2, 650), "large", True)
             
             for event in pygame.event.get():
@@ -117,6 +223,11 @@ class Menu():
                         self.difficultyLevel = "hard"
                         self.running = False
                         
+                    elif mctsButton.collidepoint(mousePosition):
+                        
+                        self.difficultyLevel = "mcts"
+                        self.running = False
+                        
                     elif backButton.collidepoint(mousePosition):
                         
                         self.difficultyLevel = "menu"
@@ -125,79 +236,53 @@ class Menu():
             pygame.display.update()
                             
         return self.difficultyLevel
-                
-class Initialise:
-    
-    def __init__(self):
-        
-        self.grid = self.makeGrid()
-        
-    def makeGrid(self) -> Dict[Position, Optional[str]]:
-        """ Make an empty grid. """
-        
-        grid: Dict[Position, Optional[str]] = {}
-        
-        for row in range(3):
-            for col in range(3):
-                grid[(row, col)] = None
-        
-        return grid
-    
+
 class DrawSymbol:
     
     def __init__(self, screen, boxLength):
         
         self.screen = screen
+        self.cache = surfaceCache
         self.symbolColours = {"circle": (232, 180, 81), "cross": (98, 193, 189)}
-        self.circleDimensions = {"width": 25, "radius": boxLength // 3}
-        self.crossDimensions = {"width": 15, "spacing": boxLength // 4}
+        self.circleDimensions = {"width": boxLength // 6, "radius": boxLength // 3}
+        self.crossDimensions = {"width": boxLength // 10, "spacing": boxLength // 4}
         self.boxLength = boxLength
         
-    def drawO(self, rectangle: pygame.rect):
+    def drawO(self, rectangle: "pygame.Rect"):
         """ Draw an O on the grid. """
         
-        pygame.draw.circle(self.screen, self.symbolColours["circle"], rectangle.center, self.circleDimensions["radius"], self.circleDimensions["width"])
+        self.screen.blit(self.cache.get(("O", self.boxLength), self.bakeO), rectangle)
         
-    def drawX(self, rectangle: pygame.rect):
+    def drawX(self, rectangle: "pygame.Rect"):
         """ Draw an X on the grid. """
     
-        x, y, w, h = rectangle
-        space, size = self.crossDimensions["spacing"], self.boxLength
-        
-        pygame.draw.line(self.screen, self.symbolColours["cross"], (x + space, y + space), (x + size - space, y + size - space), self.crossDimensions["width"])
-        pygame.draw.line(self.screen, self.symbolColours["cross"], (x + space, y + size - space), (x + size - space, y + space), self.crossDimensions["width"])
-        
-class Result:
-    
-    def __init__(self, grid: Dict[Position, Optional[str]]):
+        self.screen.blit(self.cache.get(("X", self.boxLength), self.bakeX), rectangle)
         
-        self.grid = grid
+    def bakeO(self):
+        """ Render an O onto a transparent box-sized surface. """
         
-    def tie(self) -> bool:
-        """ Check the board for a tie. """
+        surface = pygame.Surface((self.boxLength, self.boxLength), pygame.SRCALPHA)
+        pygame.draw.circle(surface, self.symbolColours["circle"], surface.get_rect().center, self.circleDimensions["radius"], self.circleDimensions["width"])
         
-        return all(symbol is not None for symbol in self.grid.values())
+        return surface
         
-    def winner(self) -> Optional[str]:
-        """ Check the board for a winner. """
+    def bakeX(self):
+        """ Render an X onto a transparent box-sized surface. """
         
-        for row in range(3):
-            if self.grid[(row, 0)] == self.grid[(row, 1)] == self.grid[(row, 2)] and self.grid[(row, 0)] is not None: return self.grid[(row, 0)]
+        surface = pygame.Surface((self.boxLength, self.boxLength), pygame.SRCALPHA)
+        space, size = self.crossDimensions["spacing"], self.boxLength
         
-        for col in range(3):
-            if self.grid[(0, col)] == self.grid[(1, col)] == self.grid[(2, col)] and self.grid[(0, col)] is not None: return self.grid[(0, col)]
-            
+        pygame.draw.line(surface, self.symbolColours["cross"], (space, space), (size - space, size - space), self.crossDimensions["width"])
+        pygame.draw.line(surface, self.symbolColours["cross"], (space, size - space), (size - space, space), self.crossDimensions["width"])
         
-        if self.grid[(0, 0)] == self.grid[(1, 1)] == self.grid[(2, 2)] and self.grid[(0, 0)] is not None: return self.grid[(0, 0)]
-        if self.grid[(2, 0)] == self.grid[(1, 1)] == self.grid[(0, 2)] and self.grid[(2, 0)] is not None: return self.grid[(2, 0)]
+        return surface
         
-        return None
-    
 class GUI:
     
     def __init__(self, screen, screenDimensions, currentPlayer, score):
         
         self.screen = screen
+        self.cache = surfaceCache
         self.screenDimensions = screenDimensions
         self.guiOffset = 100
         self.guiDimensions = {"turnIndicator": (250, 100), "menu": (100, 100), "quit": (100, 100), "cross": (100, 100), "tie": (100, 100), "circle": (100, 100)}
@@ -205,9 +290,12 @@ class GUI:
         self.guiColours = {"text": (0, 0, 0), "outline": (0, 0, 0), "turnIndicator": (36, 53, 63), "menu": (172, 190, 200), "quit": (100, 110, 69), "cross": (98, 193, 189), "tie": (172, 190, 200), "circle": (232, 180, 81)}
         self.scoreboard = score
         
-        self.fontSize = {"small": pygame.font.SysFont('Corbel', 25), "medium": pygame.font.SysFont('Corbel', 50), "large": pygame.font.SysFont('Corbel', 65)}
+        self.fontSize = {"small": Fonts.get('Corbel', 25), "medium": Fonts.get('Corbel', 50), "large": Fonts.get('Corbel', 65)}
         self.currentPlayer = currentPlayer
         
+        # Areas drawn since the game last updated the display.
+        self.dirty: list = []
+        
     def drawButtons(self, text:str, position: Position, fontSize: str, guiType: str):
         """ Draw the buttons. """
         
@@ -216,20 +304,34 @@ class GUI:
         
         rectangle = pygame.Rect(left, top, width, height)
         
-        colour = self.guiColours[guiType]
-        pygame.draw.rect(self.screen, colour, rectangle)
-        pygame.draw.rect(self.screen, self.guiColours["outline"], rectangle, 3)
-        
-        surface = self.fontSize[fontSize].render(text, True, self.guiColours["text"])
-        self.screen.blit(surface, surface.get_rect(center=position))
+        surface = self.cache.get(("gui", text, self.fontSize[fontSize], guiType), lambda: self.bakeButton(text, fontSize, guiType))
+        self.screen.blit(surface, rectangle)
+        self.dirty.append(rectangle)
         
         return rectangle
         
+    def bakeButton(self, text: str, fontSize: str, guiType: str):
+        """ Render a button with its outline and label. """
+        
+        surface = pygame.Surface(self.guiDimensions[guiType])
+        surface.fill(self.guiColours[guiType])
+        pygame.draw.rect(surface, self.guiColours["outline"], surface.get_rect(), 3)
+        
+        label = self.fontSize[fontSize].render(text, True, self.guiColours["text"])
+        surface.blit(label, label.get_rect(center=surface.get_rect().center))
+        
+        return surface
+        
     def turnIndictatorGUI(self):
         """ Draw the turn indictator at the centre top of the page. """
         
         self.drawButtons(f"{self.currentPlayer} Turn", self.guiPositions["turnIndicator"], "medium", "turnIndicator")
         
+    def thinkingGUI(self):
+        """ Show that the AI is choosing its move in the turn indicator. """
+        
+        self.drawButtons(f"{self.currentPlayer} Thinking", self.guiPositions["turnIndicator"], "medium", "turnIndicator")
+        
     def menuGUI(self):
         """ Draw the menu function at the right left of the page. """
         
@@ -259,212 +361,39 @@ class GUI:
         self.scoreboardGUI()
         self.quitGUI()
         
-class AI:
-        
-    def easy(grid: Dict[Position, Optional[str]]):
-        """ Algorithm that randomly choses an unfilled grid point. """
-        
-        available = [position for position, symbol in grid.items() if symbol is None]
-        
-        return random.choice(available) if available else None
-    
-    def medium(grid: Dict[Position, Optional[str]], player: str, ai: str):
-        """ Algorithm that follows Newell and Simon's program. """
-    
-        # 1. Win the game if possible.
-        move = aiHelper.twoInRow(grid, ai)
-        if move: return move
-        
-        # 2. Block if possible
-        move = aiHelper.twoInRow(grid, player)
-        if move: return move
-        
-        # 3. Try to create a fork
-        move = aiHelper.fork(grid, ai)
-        if move: return move
-        
-        # 4. Block a potential fork
-        move = aiHelper.fork(grid, player)
-        if move: return move
-        
-        # 5. Play the centre
-        move = aiHelper.centre(grid)
-        if move: return move
-            
-        # 6. Play the opposite corner
-        move = aiHelper.oppositeCorner(grid, player)
-        if move: return move
-        
-        # 7. Play an empty corner
-        move = aiHelper.emptyCorner(grid)
-        if move: return move
-        
-        # 8. Play an empty side
-        move = aiHelper.emptySide(grid)
-        if move: return move
-        
-        return AI.easy(grid)
-        
-    def hard(grid: Dict[Position, Optional[str]], player: str, ai: str):
-        """ Algorithm that uses the minimax theorem. """
-        
-        bestMove, bestScore = None, - float("inf")
-        
-        for position, symbol in grid.items():
-            
-            if symbol is not None: continue
-            grid[position] = ai
-            currentScore = aiHelper.minimax(grid, player, ai, False, 0)
-            grid[position] = None
-            
-            if currentScore > bestScore:
-                bestMove, bestScore = position, currentScore
-                
-        return bestMove
-        
-        
-    def aiMove(grid: Dict[Position, Optional[str]], player: str, ai: str, difficultyLevel: str):
-        """ Return the relevant move based upon the difficulty. """
-        
-        if difficultyLevel == "easy": move = AI.easy(grid)
-        elif difficultyLevel == "medium": move = AI.medium(grid, player, ai)
-        elif difficultyLevel == "hard": move = AI.hard(grid, player, ai)
-        
-        return move
-    
-class aiHelper:
-    
-    def twoInRow(grid: Dict[Position, Optional[str]], symbol: str):
-        """ Find the square for two in a row. """
-        
-        possible = [[(0, 0), (0, 1), (0, 2)], [(1, 0), (1, 1), (1, 2)], [(2, 0), (2, 1), (2, 2)],
-                    [(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1), (2, 1)], [(0, 2), (1, 2), (2, 2)],
-                    [(0, 0), (1, 1), (2, 2)], [(2, 0), (1, 1), (0, 2)]]
-                
-        for line in possible:
-            
-            value = [grid[position] for position in line]
-            if value.count(symbol) == 2 and value.count(None) == 1:
-                return line[value.index(None)]
-            
-        return None
-        
-    def fork(grid: Dict[Position, Optional[str]], symbol: str):
-        """ Find the square for a fork. """
-        
-        for position, value in grid.items():
-            
-            if value is not None: continue
-            
-            grid[position] = symbol    
-            winMove = 0
-            
-            for move, val in grid.items():
-                
-                if val is None:
-                    
-                    grid[move] = symbol
-                    result = Result(grid)
-                    if result.winner(): winMove += 1
-                    
-                    grid[move] = None
-            
-            grid[position] = None
-            
-            if winMove == 2: return position
-            
-        return None
-    
-    def centre(grid: Dict[Position, Optional[str]]):
-        """ Check the centre. """
-        
-        return (1, 1) if grid[(1, 1)] is None else None
-    
-    def oppositeCorner(grid: Dict[Position, Optional[str]], symbol: str):
-        """ Check the opposite corner. """
-        
-        corners = [(0, 0), (0, 2), (2, 0), (2, 2)]
-        
-        for corner in corners:
-            
-            if grid[corner] == symbol and grid[(2-corner[0], 2-corner[1])] is None: return (2-corner[0], 2-corner[1])
-            
-        return None
-    
-    def emptyCorner(grid: Dict[Position, Optional[str]]):
-        """ Check for an empty corner. """
-        
-        corners = [(0, 0), (0, 2), (2, 0), (2, 2)]
-        emptyCorners = []
-        
-        for corner in corners:
-            
-            if grid[corner] is None: emptyCorners.append(corner)
-            
-        return random.choice(emptyCorners) if emptyCorners else None
-    
-    def emptySide(grid: Dict[Position, Optional[str]]):
-        """ Check for an empty side. """
-        
-        sides = [(0, 1), (1, 0), (1, 2), (2, 1)]
-        emptySides = []
-        
-        for side in sides:
-            
-            if grid[side] is None: emptySides.append(side)
-            
-        return random.choice(emptySides) if emptySides else None
-    
-    def minimax(grid: Dict[Position, Optional[str]], player: str, ai:str, isMax: bool, depth: int = 0) -> int:
-        """" Find the best move in all possibilities. """
-        
-        result = Result(grid)
-        winner = result.winner()
-        
-        if winner == ai: return 10 - depth
-        elif winner == player: return -10 + depth
-        elif result.tie(): return 0
-        
-        if isMax:
-            
-            bestScore = - float("inf")
-            
-            for position, symbol in grid.items():
-                
-                if symbol is not None: continue
-                grid[position] = ai
-                currentScore = aiHelper.minimax(grid, player, ai, False, depth + 1)
-                grid[position] = None
-                bestScore = max(currentScore, bestScore)
-                
-        else:
-            
-            bestScore = float("inf")
-            
-            for position, symbol in grid.items():
-                
-                if symbol is not None: continue
-                grid[position] = player
-                currentScore = aiHelper.minimax(grid, player, ai, True, depth + 1)
-                grid[position] = None
-                bestScore = min(currentScore, bestScore)
-        
-        return bestScore
-        
 class Game:
     
-    def __init__(self, screen, screenDimensions: Position, mode: str, difficultyLevel: str):
+    def __init__(self, screen, screenDimensions: Position, mode: str, difficultyLevel: str, table: Optional[TranspositionTable] = None, size: int = 3, k: int = 3, recorder: Optional[RecordWriter] = None, fps: int = 30, aiDelay: int = 500):
         
         self.screen = screen
         self.screenDimensions = screenDimensions
-        self.boxDimensions: Dict[int] = {"length": 150, "spacing": 25, "indent": 150}
+        self.size = size
+        self.k = k
+        
+        # The boxes share a 500 pixel square whatever the board size.
+        spacing = 75 // size
+        self.boxDimensions: Dict[int] = {"length": (500 - spacing * (size - 1)) // size, "spacing": spacing, "indent": 150}
         self.colours = {"background": (29, 142, 150), "box": (36, 53, 63)}
         self.mode = mode
         self.difficultyLevel = difficultyLevel
+        self.table = table if table is not None else TranspositionTable()
         
         pygame.display.set_caption("Python Tic-tac-toe Game")
     
-        self.grid = Initialise().grid
+        self.grid = Initialise(self.size, self.k).grid
+        self.result = Result(self.grid)
+        self.record = GameRecord(self.size, self.k)
+        self.recorder = recorder
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        self.dirty: list = []
+        
+        # AI moves are searched on a worker thread and shown no sooner than aiDelay milliseconds.
+        self.aiDelay = aiDelay
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.search = None
+        self.searchStart = 0.0
+        self.searchCancel = threading.Event()
         self.symbols = DrawSymbol(self.screen, self.boxDimensions["length"])
         self.running = True
         self.playerInformation = self.playerInformation()
@@ -517,8 +446,8 @@ class Game:
     def drawBoxes(self):
         """ Draw all boxes with the relevant spacing. """
         
-        for row in range(3):
-            for col in range(3):
+        for row in range(self.size):
+            for col in range(self.size):
                 
                 rectangle = self.getBox(row, col)
                 pygame.draw.rect(self.screen, self.colours["box"], rectangle)
@@ -526,8 +455,8 @@ class Game:
     def clickBox(self, mousePosition: Position) -> Optional[Position]:
         """ Find the box being clicked upon. """
         
-        for row in range(3):
-            for col in range(3):
+        for row in range(self.size):
+            for col in range(self.size):
                 
                 rectangle = self.getBox(row, col)
                 if rectangle.collidepoint(mousePosition):
@@ -541,7 +470,8 @@ class Game:
         clickedBox = self.clickBox(mousePosition)
         if clickedBox and self.grid[clickedBox] is None:
         
-            self.grid[clickedBox] = self.currentPlayer
+            self.result.make(clickedBox, self.currentPlayer)
+            self.record.add(clickedBox, self.currentPlayer)
             rectangle = self.getBox(*clickedBox)
         
             if self.currentPlayer == "O": 
@@ -550,18 +480,24 @@ class Game:
             elif self.currentPlayer == "X": 
                 self.symbols.drawX(rectangle)
                 
+            self.dirty.append(rectangle)
             self.playerChange()
                 
                 
-    def aiTurn(self):
-        """ Return the ai's turn. """
+    def opponent(self) -> str:
+        """ Return the symbol of the player waiting for their turn. """
         
-        player = self.playerInformation["player1"][0] if self.currentTurn == "player2" else self.playerInformation["player2"][0]
-        move = AI.aiMove(self.grid, player, self.currentPlayer, self.difficultyLevel)
+        return self.playerInformation["player1"][0] if self.currentTurn == "player2" else self.playerInformation["player2"][0]
+        
+    def aiTurn(self, move: Optional[Position] = None):
+        """ Return the ai's turn, searching for the move here unless one is given. """
+        
+        if move is None: move = AI.aiMove(self.grid, self.opponent(), self.currentPlayer, self.difficultyLevel, self.table)
         
         if move:
             
-            self.grid[move] = self.currentPlayer
+            self.result.make(move, self.currentPlayer)
+            self.record.add(move, self.currentPlayer)
             rectangle = self.getBox(*move)
             
             if self.currentPlayer == "O": 
@@ -570,26 +506,37 @@ class Game:
             elif self.currentPlayer == "X": 
                 self.symbols.drawX(rectangle)
                 
+            self.dirty.append(rectangle)
             self.playerChange()
             
     def checkResult(self):
         """ Check the result. """
         
-        result = Result(self.grid)
+        result = self.result
         winner = result.winner()
         
         if winner:
             self.scoreboard[self.resultMap[winner]] += 1
+            self.saveRecord(winner)
             self.gridReset()
             
         elif result.tie():
             self.scoreboard["tie"] += 1
+            self.saveRecord(None)
             self.gridReset()
+            
+    def saveRecord(self, winner: Optional[str]):
+        """ Write the finished game's moves if the game is being recorded. """
+        
+        self.record.winner = winner
+        if self.recorder is not None: self.recorder.write(self.record)
                 
     def gridReset(self):
         """ Reset the grid after the game is completed. """
         
-        self.grid = Initialise().grid
+        self.grid = Initialise(self.size, self.k).grid
+        self.result = Result(self.grid)
+        self.record = GameRecord(self.size, self.k)
         players = ["player1", "player2"]
         random.shuffle(players)
         self.currentTurn = players[0]
@@ -598,56 +545,369 @@ class Game:
         self.drawBoxes()
         self.gui.currentPlayer = self.currentPlayer
         self.gui.drawGUI()
+        self.dirty.append(self.screen.get_rect())
+        
+    def render(self):
+        """ Update only the areas drawn since the last frame. """
+        
+        dirty = self.dirty + self.gui.dirty
+        
+        if dirty:
+            pygame.display.update(dirty)
+            self.dirty.clear()
+            self.gui.dirty.clear()
+        
+    def startSearch(self):
+        """ Search for the AI's move on the worker thread. """
+        
+        self.searchCancel = threading.Event()
+        self.searchStart = time.perf_counter()
+        self.search = self.executor.submit(AI.aiMove, self.grid.copy(), self.opponent(), self.currentPlayer, self.difficultyLevel, self.table, cancel=self.searchCancel)
+        self.gui.thinkingGUI()
+        
+    def searchReady(self) -> bool:
+        """ Check whether the AI's move is found and has been shown for long enough. """
+        
+        return self.search.done() and (time.perf_counter() - self.searchStart) * 1000 >= self.aiDelay
+    
+    def cancelSearch(self):
+        """ Stop waiting on the AI and tell any running search to give up. """
+        
+        self.searchCancel.set()
+        self.search = None
+        
+    def finish(self, result: str) -> str:
+        """ Stop the game loop and the AI worker. """
+        
+        self.running = False
+        self.cancelSearch()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        
+        return result
         
     def run(self):
         
+        # The buttons never change, so they are drawn once and only their areas are kept.
+        menuClicked = self.gui.menuGUI()
+        quitClicked = self.gui.quitGUI()
+        
         while self.running:
             
-            menuClicked = self.gui.menuGUI()
-            quitClicked = self.gui.quitGUI()
-            
             if self.currentType == "ai": 
-                pygame.time.delay(500)
-                self.aiTurn()
-                self.checkResult()
+                
+                if self.search is None: self.startSearch()
+                
+                elif self.searchReady():
+                    
+                    move = self.search.result()
+                    self.search = None
+                    self.aiTurn(move)
+                    self.checkResult()
+                
+            self.render()
             
-            for event in pygame.event.get():
+            # Sleep until the next event while waiting on a player.
+            events = pygame.event.get() if self.currentType == "ai" else [pygame.event.wait()] + pygame.event.get()
+            
+            for event in events:
                 
                 if event.type == pygame.QUIT:
-                    self.running = False
-                    return "quit"
+                    return self.finish("quit")
                     
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     
                     mousePosition = pygame.mouse.get_pos()
                     
                     if menuClicked.collidepoint(mousePosition):
-                        
-                        self.running = False
-                        return "menu"
+                        return self.finish("menu")
                     
                     if quitClicked.collidepoint(mousePosition):
-                        
-                        self.running= False
-                        return "quit"
+                        return self.finish("quit")
                     
                     if self.currentType == "player": 
                         self.playerTurn(mousePosition)
                         self.checkResult()
+                        
+                self.handleEvent(event)
                 
-            pygame.display.update()
+            self.render()
+            self.clock.tick(self.fps)
             
-        return "quit"
+        return self.finish("quit")
+    
+    def handleEvent(self, event):
+        """ Act on any other event; a local game has none. """
+        
+        pass
+    
+class OnlineGame(Game):
+    """ Game against another client or the server's AI, with the server deciding every move and result. """
+    
+    def __init__(self, screen, screenDimensions: Position, client: GameClient, level: Optional[str] = None, size: int = 3, k: int = 3, recorder: Optional[RecordWriter] = None, fps: int = 30):
+        
+        super().__init__(screen, screenDimensions, "online", level, None, size, k, recorder, fps, 0)
+        
+        # Server lines wake the game loop as pygame events.
+        self.networkEvent = pygame.USEREVENT
+        self.client = client
+        self.client.onMessage = lambda words: pygame.event.post(pygame.event.Event(self.networkEvent, words=words))
+        self.client.play(size, k, level)
+        
+    def playerInformation(self):
+        """ Wait on the server to say who plays which symbol. """
+        
+        return {"player1": ("X", "remote"), "player2": ("O", "remote")}
+    
+    def playerTurn(self, mousePosition: Position):
+        """ Send the player's move, which is drawn once the server plays it. """
+        
+        clickedBox = self.clickBox(mousePosition)
+        
+        if clickedBox and self.grid[clickedBox] is None:
+            self.client.move(clickedBox)
+            self.currentType = "remote"
+            
+    def checkResult(self):
+        """ Leave the result to the server. """
         
+        pass
+    
+    def startGame(self, symbol: str, first: str):
+        """ Clear the board for a game the server has started. """
+        
+        second = "O" if first == "X" else "X"
+        self.playerInformation = {"player1": (first, "player" if first == symbol else "remote"), "player2": (second, "player" if second == symbol else "remote")}
+        self.grid = Initialise(self.size, self.k).grid
+        self.result = Result(self.grid)
+        self.record = GameRecord(self.size, self.k)
+        self.currentTurn = "player1"
+        self.currentPlayer, self.currentType = self.playerInformation["player1"]
+        self.drawBoxes()
+        self.gui.currentPlayer = self.currentPlayer
+        self.gui.drawGUI()
+        self.dirty.append(self.screen.get_rect())
+        
+    def handleEvent(self, event):
+        """ Follow the server: start games, draw every move and count the results. """
+        
+        if event.type != self.networkEvent: return
+        
+        words = event.words
+        
+        if words[0] == "START": self.startGame(words[1], words[2])
+        elif words[0] == "MOVE": self.aiTurn((int(words[2]), int(words[3])))
+        elif words[0] == "END":
+            
+            winner = None if words[1] == "tie" else words[1]
+            self.scoreboard[self.resultMap[winner] if winner else "tie"] += 1
+            self.saveRecord(winner)
+            self.gui.drawGUI()
+            self.currentType = "remote"
+            self.client.play(self.size, self.k, self.difficultyLevel)
+            
+        elif words[0] == "CLOSED": self.running = False
+
 if __name__ == "__main__":
     
+    parser = argparse.ArgumentParser(description="Python Tic-tac-toe Game")
+    commands = parser.add_subparsers(dest="command")
+    
+    buildParser = commands.add_parser("build-solved", help="solve every position and write the Hard AI table")
+    buildParser.add_argument("path", nargs="?", default=SolvedTable.defaultPath)
+    
+    compareParser = commands.add_parser("compare-search", help="compare minimax and alpha-beta moves and node counts")
+    
+    simulateParser = commands.add_parser("simulate", help="play AI difficulties against each other without a display")
+    simulateParser.add_argument("first", choices=list(AI.strategies))
+    simulateParser.add_argument("second", choices=list(AI.strategies))
+    simulateParser.add_argument("--games", type=int, default=100)
+    simulateParser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    simulateParser.add_argument("--time-budget", type=float, default=1.0, help="seconds per Hard move on bigger boards and per MCTS move")
+    
+    tournamentParser = commands.add_parser("tournament", help="play AI difficulties against each other on every core")
+    tournamentParser.add_argument("first", choices=list(AI.strategies))
+    tournamentParser.add_argument("second", choices=list(AI.strategies))
+    tournamentParser.add_argument("--games", type=int, default=100000)
+    tournamentParser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of cores")
+    tournamentParser.add_argument("--chunk-size", type=int, default=1000, help="games each worker plays before reporting back")
+    tournamentParser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    tournamentParser.add_argument("--time-budget", type=float, default=1.0, help="seconds per Hard move on bigger boards and per MCTS move")
+    
+    recordsParser = commands.add_parser("records", help="summarise the games in a record file")
+    recordsParser.add_argument("path")
+    
+    benchParser = commands.add_parser("bench", help="time the AI levels and board operations")
+    benchParser.add_argument("--repeat", type=int, default=200, help="passes over the fixed positions per AI level")
+    benchParser.add_argument("--rounds", type=int, default=5, help="times each metric is measured, keeping the best")
+    benchParser.add_argument("--output", metavar="PATH", default=None, help="write the results as JSON")
+    benchParser.add_argument("--baseline", metavar="PATH", default=None, help="JSON results from an earlier run to compare against")
+    benchParser.add_argument("--threshold", type=float, default=0.2, help="fraction a metric may get worse before the run fails")
+    
+    exportParser = commands.add_parser("export-positions", help="solve every reachable position and write them as NumPy columns")
+    exportParser.add_argument("directory")
+    exportParser.add_argument("--first", choices=["X", "O"], default="X", help="symbol that moves first")
+    exportParser.add_argument("--moves", nargs="*", default=[], metavar="ROW,COL", help="opening moves to start from, for boards too big to solve whole")
+    
+    datasetParser = commands.add_parser("dataset", help="label self-play positions on every core and write them as training shards")
+    datasetParser.add_argument("directory")
+    datasetParser.add_argument("--samples", type=int, default=100000, help="distinct positions to write")
+    datasetParser.add_argument("--workers", type=int, default=None, help="processes labelling positions, defaults to the number of cores")
+    datasetParser.add_argument("--shard-size", type=int, default=1 << 20, help="samples per shard file")
+    datasetParser.add_argument("--depth", type=int, default=2, help="plies searched to label positions on boards bigger than 3x3")
+    datasetParser.add_argument("--time-budget", type=float, default=1.0, help="seconds per label search on boards bigger than 3x3")
+    datasetParser.add_argument("--seed", type=int, default=None, help="seed the self-play games for a repeatable dataset")
+    
+    serveParser = commands.add_parser("serve", help="host games for network clients")
+    serveParser.add_argument("--host", default="127.0.0.1")
+    serveParser.add_argument("--port", type=int, default=8765)
+    serveParser.add_argument("--move-timeout", type=float, default=30.0, help="seconds a client has for each move before forfeiting")
+    serveParser.add_argument("--game-timeout", type=float, default=900.0, help="seconds before an unfinished game is called a tie")
+    serveParser.add_argument("--workers", type=int, default=None, help="processes searching AI moves, defaults to the number of cores")
+    serveParser.add_argument("--time-budget", type=float, default=1.0, help="seconds per Hard move on bigger boards and per MCTS move")
+    
+    connectParser = commands.add_parser("connect", help="play on a game server")
+    connectParser.add_argument("--host", default="127.0.0.1")
+    connectParser.add_argument("--port", type=int, default=8765)
+    connectParser.add_argument("--level", choices=list(AI.strategies), default=None, help="play the server's AI instead of another client")
+    
+    parser.add_argument("--size", type=int, default=3, help="number of rows and columns on the board")
+    parser.add_argument("--k", type=int, default=3, help="marks in a row needed to win")
+    parser.add_argument("--record", metavar="PATH", default=None, help="append every finished game to a record file")
+    parser.add_argument("--fps", type=int, default=30, help="most frames drawn each second during a game")
+    parser.add_argument("--ai-delay", type=int, default=500, help="least milliseconds before an AI move is shown")
+    parser.add_argument("--mcts-iterations", type=int, default=2000, help="most playouts per MCTS move, 0 to use only the time budget")
+    parser.add_argument("--move-cache", metavar="PATH", default=None, help="keep Medium and Hard replies in a file so later runs start warm")
+    parser.add_argument("--mcts-workers", type=int, default=1, help="processes searching each MCTS move in parallel")
+    
+    args = parser.parse_args()
+    if not 1 <= args.k <= args.size: parser.error("--k must be between 1 and --size")
+    AI.tree = MCTS(args.mcts_iterations or None, workers=args.mcts_workers)
+    
+    if args.move_cache:
+        AI.cache = MoveCache(path=args.move_cache)
+        atexit.register(AI.cache.save)
+    
+    if args.command == "build-solved":
+        
+        print(f"Solved {SolvedTable.build(args.path)} positions into {args.path}")
+        raise SystemExit
+    
+    if args.command == "compare-search":
+        
+        openings = [[], [((1, 1), "X")], [((0, 0), "X")], [((0, 1), "X")], [((0, 0), "X"), ((1, 1), "O")]]
+        
+        for opening in openings:
+            
+            grid = Initialise().grid
+            for position, symbol in opening: grid[position] = symbol
+            ai = "O" if len(opening) % 2 else "X"
+            player = "X" if ai == "O" else "O"
+            
+            for name, search in (("minimax", aiHelper.bestMove), ("alphabeta", aiHelper.alphaBetaMove)):
+                move, score = search(grid, player, ai)
+                print(f"{str(opening):<32} {name:<10} move {move} score {score:>3} nodes {aiHelper.nodes}")
+                
+        raise SystemExit
+    
+    if args.command == "simulate":
+        
+        recorder = RecordWriter(args.record) if args.record else None
+        simulation = Simulation((args.first, args.second), args.seed, args.size, args.k, timeBudget=args.time_budget, recorder=recorder)
+        print(Simulation.report(simulation.run(args.games)))
+        AI.tree.close()
+        raise SystemExit
+    
+    if args.command == "tournament":
+        
+        tournament = Tournament((args.first, args.second), args.games, args.workers, args.chunk_size, args.seed, args.size, args.k, args.time_budget, args.record)
+        print(Tournament.report(tournament.run()))
+        raise SystemExit
+    
+    if args.command == "records":
+        
+        games, moves = 0, 0
+        scoreboard: Dict[str, int] = {"cross": 0, "tie": 0, "circle": 0}
+        
+        for record in GameRecord.read(args.path):
+            
+            games += 1
+            moves += len(record.moves)
+            scoreboard[{"X": "cross", None: "tie", "O": "circle"}[record.winner]] += 1
+            
+        print(f"{games} games, {moves / max(games, 1):.2f} moves per game")
+        print(" | ".join(f"{label.capitalize()} : {wins}" for label, wins in scoreboard.items()))
+        raise SystemExit
+    
+    if args.command == "bench":
+        
+        results = Benchmark(args.repeat, rounds=args.rounds).run()
+        for name, value in results.items(): print(f"{name:<32} {value:>16,.1f}")
+        
+        if args.output:
+            with open(args.output, "w") as file: json.dump(results, file, indent=4)
+            
+        if args.baseline:
+            
+            with open(args.baseline) as file: baseline = json.load(file)
+            worse = Benchmark.regressions(results, baseline, args.threshold)
+            
+            for line in worse: print(f"regression {line}")
+            raise SystemExit(1 if worse else 0)
+            
+        raise SystemExit
+    
+    if args.command == "export-positions":
+        
+        grid = Initialise(args.size, args.k).grid
+        symbol = args.first
+        
+        for move in args.moves:
+            grid[tuple(int(number) for number in move.split(","))] = symbol
+            symbol = "O" if symbol == "X" else "X"
+            
+        start = time.perf_counter()
+        summary = GameTree(grid, args.first, args.size, args.k).export(args.directory)
+        
+        print(f"{summary['positions']} positions in {time.perf_counter() - start:.2f}s written to {args.directory}")
+        print(f"X forced wins : {summary['xWins']} | Draws : {summary['draws']} | O forced wins : {summary['oWins']}")
+        raise SystemExit
+    
+    if args.command == "dataset":
+        
+        start = time.perf_counter()
+        summary = Dataset(args.directory, args.size, args.k, args.workers, args.shard_size, depth=args.depth, timeBudget=args.time_budget,
+                          seed=args.seed).run(args.samples)
+        
+        print(f"{summary['samples']} samples in {summary['shards']} shards in {time.perf_counter() - start:.2f}s written to {args.directory}")
+        raise SystemExit
+    
+    if args.command == "serve":
+        
+        recorder = RecordWriter(args.record) if args.record else None
+        GameServer(args.move_timeout, args.game_timeout, args.workers, args.time_budget, recorder).serve(args.host, args.port)
+        if recorder is not None: recorder.close()
+        raise SystemExit
+    
     width, height = 800, 800
     
-    pygame.init()
-    pygame.font.init()
+    loadPygame()
     
     screen = pygame.display.set_mode((width, height))
     
+    if args.command == "connect":
+        
+        recorder = RecordWriter(args.record) if args.record else None
+        client = GameClient(args.host, args.port)
+        OnlineGame(screen, (width, height), client, args.level, args.size, args.k, recorder, args.fps).run()
+        client.close()
+        
+        if recorder is not None: recorder.close()
+        pygame.quit()
+        raise SystemExit
+    
+    # One table for every game so the Hard AI keeps its solved positions between matches.
+    table = TranspositionTable()
+    recorder = RecordWriter(args.record) if args.record else None
     mode = "menu"
     
     while True:
@@ -659,7 +919,7 @@ if __name__ == "__main__":
             
         elif mode == "pvp":
             
-            game = Game(screen, (width, height), mode, None)
+            game = Game(screen, (width, height), mode, None, table, args.size, args.k, recorder, args.fps, args.ai_delay)
             game.mode = mode
             result = game.run()
             
@@ -674,7 +934,7 @@ if __name__ == "__main__":
             
             if difficulty == "menu": mode = "menu"
             else:
-                game = Game(screen, (width, height), mode, difficulty)
+                game = Game(screen, (width, height), mode, difficulty, table, args.size, args.k, recorder, args.fps, args.ai_delay)
                 result = game.run()
             
                 if result == "menu": mode = "menu"
@@ -684,5 +944,7 @@ if __name__ == "__main__":
             
             break
         
+    if recorder is not None: recorder.close()
+    AI.tree.close()
     pygame.quit()
         
\ No newline at end of file
@@ -0,0 +1,407 @@
+"""
+Python Tic-tac-toe Server
+
+Hosts games between clients, or against the server's AI, over a line-delimited text protocol.
+
+Client to server:
+    PLAY <size> <k> [level]         queue for a board, or play the server's AI at a level
+    MOVE <row> <col>                mark a square on your turn
+    QUIT                            leave, forfeiting any game in play
+
+Server to client:
+    WAIT                            queued until another client wants the same board
+    START <you> <first> <size> <k>  a game has begun
+    MOVE <symbol> <row> <col>       every move, your own included
+    END <X|O|tie> <reason>          the game is over: line, full, timeout, left or closed
+    ERROR <reason>                  the last command was refused
+"""
+
+# Imported Functions
+
+import asyncio
+import queue
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Tuple, Optional
+
+from tictactoe import Position, Board, Initialise, Result, GameRecord, RecordWriter, AI
+
+class Connection:
+    """ One client of the server and the match it is playing. """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        self.reader = reader
+        self.writer = writer
+        self.task = asyncio.current_task()
+        self.match: Optional["Match"] = None
+        self.symbol: Optional[str] = None
+        self.queued: Optional[Tuple[int, int]] = None
+
+    def send(self, *words):
+        """ Write one line to the client. """
+
+        if not self.writer.is_closing(): self.writer.write((" ".join(str(word) for word in words) + "\n").encode())
+
+class Match:
+    """ One game on the server, kept in a grid and Result and taking turns like Game. """
+
+    def __init__(self, server: "GameServer", size: int, k: int, seats: list, level: Optional[str] = None):
+
+        self.server = server
+        self.size = size
+        self.k = k
+        self.level = level
+        self.grid = Initialise(size, k).grid
+        self.result = Result(self.grid)
+        self.record = GameRecord(size, k)
+        self.finished = False
+
+        # A seat of None is played by the server's AI.
+        playerSymbols = ["X", "O"]
+        random.shuffle(playerSymbols)
+        random.shuffle(seats)
+        self.playerInformation = {"player1": (playerSymbols[0], seats[0]), "player2": (playerSymbols[1], seats[1])}
+        self.currentTurn = "player1"
+        self.currentPlayer, self.currentSeat = self.playerInformation["player1"]
+
+        loop = asyncio.get_running_loop()
+        self.moveTimer: Optional[asyncio.TimerHandle] = None
+        self.gameTimer = loop.call_later(server.gameTimeout, self.end, "tie", "timeout")
+
+    def connections(self) -> list:
+        """ Return the clients playing this match. """
+
+        return [seat for symbol, seat in self.playerInformation.values() if seat is not None]
+
+    def opponent(self) -> str:
+        """ Return the symbol of the player waiting for their turn. """
+
+        return "O" if self.currentPlayer == "X" else "X"
+
+    def start(self):
+        """ Tell the clients their symbols and start the first turn. """
+
+        for symbol, seat in self.playerInformation.values():
+
+            if seat is None: continue
+            seat.match, seat.symbol = self, symbol
+            seat.send("START", symbol, self.currentPlayer, self.size, self.k)
+
+        self.nextTurn()
+
+    def playerChange(self):
+        """ Switch between players after a turn. """
+
+        self.currentTurn = "player2" if self.currentTurn == "player1" else "player1"
+        self.currentPlayer, self.currentSeat = self.playerInformation[self.currentTurn]
+
+    def nextTurn(self):
+        """ Start the clock on a client's move, or ask the AI for its move. """
+
+        loop = asyncio.get_running_loop()
+
+        if self.currentSeat is None: loop.create_task(self.aiTurn())
+        else: self.moveTimer = loop.call_later(self.server.moveTimeout, self.end, self.opponent(), "timeout")
+
+    async def aiTurn(self):
+        """ Search for the AI's move in a worker process so the event loop keeps serving. """
+
+        board = self.result.board
+        loop = asyncio.get_running_loop()
+
+        try:
+            move = await loop.run_in_executor(self.server.aiExecutor(), GameServer.workerMove, board.x, board.o, self.size, self.k,
+                                              self.opponent(), self.currentPlayer, self.level, self.server.timeBudget)
+        except BrokenProcessPool:
+            self.server.executor = None
+            move = None
+        except Exception:
+            move = None
+
+        if self.finished: return
+
+        # A worker that failed or gave no square is covered by a random move here, so the match never waits on it.
+        if move is None or self.grid.get(move, "taken") is not None: move = AI.easy(self.grid)
+        self.play(move)
+
+    def move(self, connection: Connection, position: Position) -> Optional[str]:
+        """ Play a client's move, returning why it was refused if it was. """
+
+        if connection is not self.currentSeat: return "not your turn"
+        if position not in self.grid: return "no such square"
+        if self.grid[position] is not None: return "square taken"
+
+        self.moveTimer.cancel()
+        self.play(position)
+
+        return None
+
+    def play(self, position: Position):
+        """ Make a move, tell the clients and then end the game or pass the turn. """
+
+        symbol = self.currentPlayer
+        self.result.make(position, symbol)
+        self.record.add(position, symbol)
+
+        for connection in self.connections(): connection.send("MOVE", symbol, *position)
+
+        winner = self.result.winner()
+
+        if winner: self.end(winner, "line")
+        elif self.result.tie(): self.end("tie", "full")
+        else:
+            self.playerChange()
+            self.nextTurn()
+
+    def end(self, winner: str, reason: str):
+        """ Finish the game, telling the clients and recording it. """
+
+        if self.finished: return
+
+        self.finished = True
+        self.gameTimer.cancel()
+        if self.moveTimer is not None: self.moveTimer.cancel()
+
+        for connection in self.connections():
+
+            connection.send("END", winner, reason)
+            connection.match = connection.symbol = None
+
+        self.record.winner = None if winner == "tie" else winner
+        if self.server.recorder is not None: self.server.recorder.write(self.record)
+        self.server.matches.discard(self)
+
+class GameServer:
+    """ Accepts clients, pairs them into matches and plays the AI for those who ask for it. """
+
+    def __init__(self, moveTimeout: float = 30.0, gameTimeout: float = 900.0, workers: Optional[int] = None, timeBudget: float = 1.0,
+                 recorder: Optional[RecordWriter] = None, maxSize: int = 15):
+
+        self.moveTimeout = moveTimeout
+        self.gameTimeout = gameTimeout
+        self.workers = workers
+        self.timeBudget = timeBudget
+        self.recorder = recorder
+        self.maxSize = maxSize
+        self.matches: set = set()
+        self.connections: set = set()
+
+        # At most one client waits for an opponent on each board size and line length.
+        self.waiting: Dict[Tuple[int, int], Connection] = {}
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def workerMove(x: int, o: int, size: int, k: int, player: str, ai: str, level: str, timeBudget: float) -> Optional[Position]:
+        """ Find the AI's move in a worker process from the packed board, falling back to a cheaper level rather than run past the budget. """
+
+        return AI.aiMove(Board(x, o, size, k), player, ai, level, timeBudget=timeBudget, deadline=time.perf_counter() + timeBudget)
+
+    def aiExecutor(self) -> ProcessPoolExecutor:
+        """ Return the worker processes for AI moves, starting them the first time they are needed or after they broke. """
+
+        if self.executor is None: self.executor = ProcessPoolExecutor(self.workers)
+
+        return self.executor
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        """ Listen for clients, on any free port when port is 0. """
+
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+
+        return self.server
+
+    @property
+    def port(self) -> int:
+
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """ Stop listening, end every match, hang up on the clients and stop the AI workers. """
+
+        self.server.close()
+
+        for match in list(self.matches): match.end("tie", "closed")
+        connections = list(self.connections)
+        for connection in connections: connection.writer.close()
+
+        await asyncio.gather(*(connection.task for connection in connections), return_exceptions=True)
+        await self.server.wait_closed()
+        if self.executor is not None: self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        """ Run the server until it is interrupted. """
+
+        async def main():
+
+            server = await self.start(host, port)
+            print(f"Serving on {host}:{self.port}")
+
+            try:
+                async with server: await server.serve_forever()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Read one client's commands until it quits or disconnects. """
+
+        connection = Connection(reader, writer)
+        self.connections.add(connection)
+
+        try:
+
+            while True:
+
+                line = await reader.readline()
+                words = line.decode("ascii", "replace").split()
+                if not line or words[:1] == ["QUIT"]: break
+
+                if words: self.command(connection, words)
+                await writer.drain()
+
+        except (ConnectionError, ValueError):
+            pass
+
+        finally:
+
+            self.leave(connection)
+            self.connections.discard(connection)
+            writer.close()
+
+    def command(self, connection: Connection, words: list):
+        """ Act on one line from a client. """
+
+        if words[0] == "PLAY": error = self.play(connection, words[1:])
+        elif words[0] == "MOVE": error = self.move(connection, words[1:])
+        else: error = f"unknown command {words[0]}"
+
+        if error: connection.send("ERROR", error)
+
+    def play(self, connection: Connection, arguments: list) -> Optional[str]:
+        """ Start a game against the AI, or pair the client with the next one wanting the same board. """
+
+        if connection.match is not None: return "already playing"
+
+        try:
+            size, k = int(arguments[0]), int(arguments[1])
+        except (IndexError, ValueError):
+            return "usage PLAY size k [level]"
+
+        level = arguments[2] if len(arguments) > 2 else None
+        if not 3 <= size <= self.maxSize or not 1 <= k <= size: return "no such board"
+        if level is not None and level not in AI.strategies: return f"unknown level {level}"
+
+        self.unqueue(connection)
+
+        if level is not None: seats = [connection, None]
+        else:
+
+            opponent = self.waiting.pop((size, k), None)
+
+            if opponent is None:
+
+                self.waiting[(size, k)] = connection
+                connection.queued = (size, k)
+                connection.send("WAIT")
+                return None
+
+            opponent.queued = None
+            seats = [opponent, connection]
+
+        match = Match(self, size, k, seats, level)
+        self.matches.add(match)
+        match.start()
+
+        return None
+
+    def move(self, connection: Connection, arguments: list) -> Optional[str]:
+        """ Pass a client's move to its match. """
+
+        if connection.match is None: return "no game"
+
+        try:
+            row, col = int(arguments[0]), int(arguments[1])
+        except (IndexError, ValueError):
+            return "usage MOVE row col"
+
+        return connection.match.move(connection, (row, col))
+
+    def unqueue(self, connection: Connection):
+        """ Stop a client waiting for an opponent. """
+
+        if connection.queued is not None and self.waiting.get(connection.queued) is connection: del self.waiting[connection.queued]
+        connection.queued = None
+
+    def leave(self, connection: Connection):
+        """ Drop a client, forfeiting any game it was playing. """
+
+        self.unqueue(connection)
+        if connection.match is not None: connection.match.end("O" if connection.symbol == "X" else "X", "left")
+
+class GameClient:
+    """ Blocking client that reads the server's lines on a background thread. """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, onMessage=None, timeout: float = 10.0):
+
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.settimeout(None)
+        self.file = self.socket.makefile("r", encoding="ascii", newline="\n")
+
+        # Each line arrives as a list of words, passed to onMessage if given and queued otherwise.
+        self.onMessage = onMessage
+        self.messages: "queue.Queue[list]" = queue.Queue()
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+
+    def listen(self):
+        """ Hand on every line from the server, then ["CLOSED"] once it hangs up. """
+
+        try:
+            for line in self.file: self.deliver(line.split())
+        except (OSError, ValueError):
+            pass
+
+        self.deliver(["CLOSED"])
+
+    def deliver(self, words: list):
+
+        if self.onMessage is not None: self.onMessage(words)
+        else: self.messages.put(words)
+
+    def send(self, *words):
+        """ Write one line to the server. """
+
+        self.socket.sendall((" ".join(str(word) for word in words) + "\n").encode())
+
+    def play(self, size: int = 3, k: int = 3, level: Optional[str] = None):
+
+        if level is None: self.send("PLAY", size, k)
+        else: self.send("PLAY", size, k, level)
+
+    def move(self, position: Position):
+
+        self.send("MOVE", *position)
+
+    def receive(self, timeout: Optional[float] = None) -> list:
+        """ Wait for the next line from the server. """
+
+        return self.messages.get(timeout=timeout)
+
+    def close(self):
+        """ Say goodbye and close the connection. """
+
+        try:
+            self.send("QUIT")
+        except OSError:
+            pass
+
+        self.socket.close()
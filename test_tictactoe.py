@@ -0,0 +1,40 @@
+"""
+Allocation bounds for the AI's hot paths, run with python -m unittest or pytest.
+"""
+
+import sys
+import unittest
+
+from tictactoe import Board, LineCounts, aiHelper, Benchmark
+
+class Allocations(unittest.TestCase):
+
+    # Allocations allowed for a whole search or batch of calls, far below one per node or per call.
+    bound = 32
+
+    def testMinimax(self):
+
+        board = Board(x=0b000010000)
+        blocks = sys.getallocatedblocks()
+
+        self.assertLessEqual(Benchmark.allocations(lambda: aiHelper.bestMove(board, "X", "O")), self.bound)
+        self.assertGreater(aiHelper.nodes, 50000)
+        self.assertLessEqual(sys.getallocatedblocks() - blocks, 256)
+
+    def testFork(self):
+
+        board = Board(x=0b000010000)
+        counts = LineCounts(board)
+
+        self.assertLessEqual(Benchmark.allocations(lambda: [aiHelper.fork(board, "O", counts) for _ in range(1000)]), self.bound)
+
+    def testForkBiggerBoard(self):
+
+        board = Board(size=7, k=4)
+        board[(3, 3)], board[(3, 4)], board[(2, 2)] = "X", "O", "X"
+        counts = LineCounts(board)
+
+        self.assertLessEqual(Benchmark.allocations(lambda: [aiHelper.fork(board, "X", counts) for _ in range(200)]), self.bound)
+
+if __name__ == "__main__":
+    unittest.main()
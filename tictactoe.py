@@ -0,0 +1,2643 @@
+"""
+Python Tic-tac-toe Engine
+
+Boards, AI players and headless play, importable without pygame or a display.
+"""
+
+# Imported Functions
+
+import gc
+import math
+import mmap
+import os
+import random
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Dict, Tuple, Optional
+
+Position = Tuple[int, int]
+
+class Topology:
+    """ Squares and winning lines of a size x size board that needs k in a row. """
+
+    cache: Dict[Tuple[int, int], "Topology"] = {}
+
+    def __init__(self, size: int, k: int):
+
+        if not 1 <= k <= size: raise ValueError(f"Cannot need {k} in a row on a {size}x{size} board")
+
+        self.size = size
+        self.k = k
+        self.cells = size * size
+
+        # Square (row, col) is stored in bit row * size + col.
+        self.positions = [(row, col) for row in range(size) for col in range(size)]
+        self.bits = {position: 1 << index for index, position in enumerate(self.positions)}
+        self.indices = {position: index for index, position in enumerate(self.positions)}
+        self.full = (1 << self.cells) - 1
+        self.centre = (size // 2, size // 2)
+
+        # Every window of k squares along a row, column, diagonal and anti-diagonal.
+        self.lines = []
+
+        for rowStep, colStep, firstCol in ((0, 1, 0), (1, 0, 0), (1, 1, 0), (1, -1, k - 1)):
+            for row in range(size - rowStep * (k - 1)):
+                for col in range(firstCol, size - (k - 1) * (colStep == 1)):
+                    self.lines.append(sum(self.bits[(row + step * rowStep, col + step * colStep)] for step in range(k)))
+
+        self.linesThrough = [[line for line in self.lines if line >> index & 1] for index in range(self.cells)]
+        self.lineIndicesThrough = [[number for number, line in enumerate(self.lines) if line >> index & 1] for index in range(self.cells)]
+
+        # Corners with the corner facing each one, and the edge squares between them.
+        last = size - 1
+        self.corners = [(0, 0), (0, last), (last, 0), (last, last)]
+        self.oppositeCorners = {(row, col): (last - row, last - col) for row, col in self.corners}
+        self.sides = [(row, col) for row, col in self.positions if (row in (0, last)) != (col in (0, last))]
+
+        # The squares touching each square, including diagonally.
+        self.neighbours = [sum(self.bits.get((row + rowStep, col + colStep), 0) for rowStep in (-1, 0, 1) for colStep in (-1, 0, 1)) & ~self.bits[(row, col)]
+                           for row, col in self.positions]
+
+        # Small boards check every pattern in a single lookup.
+        self.wins = bytes(any(pattern & line == line for line in self.lines) for pattern in range(1 << self.cells)) if self.cells <= 9 else None
+
+    def get(size: int = 3, k: int = 3) -> "Topology":
+        """ Return the shared topology for a board size and line length. """
+
+        topology = Topology.cache.get((size, k))
+
+        if topology is None: topology = Topology.cache[(size, k)] = Topology(size, k)
+
+        return topology
+
+    def of(grid: Dict[Position, Optional[str]]) -> "Topology":
+        """ Return the topology of a board, treating a dict grid as needing 3 in a row. """
+
+        if isinstance(grid, Board): return grid.topology
+
+        return Topology.get(int(len(grid) ** 0.5), 3)
+
+class Board:
+    """ Bitboard grid that packs the X and O squares into two integers. """
+
+    # The classic 3x3 layout, used by the solved table and the symmetry tables.
+    classic = Topology.get(3, 3)
+    positions = classic.positions
+    bits = classic.bits
+    full = classic.full
+    lines = classic.lines
+
+    __slots__ = ("x", "o", "topology")
+
+    def __init__(self, x: int = 0, o: int = 0, size: int = 3, k: int = 3):
+
+        self.x = x
+        self.o = o
+        self.topology = Topology.get(size, k)
+
+    @classmethod
+    def fromGrid(cls, grid: Dict[Position, Optional[str]], k: int = 3) -> "Board":
+        """ Make a board from a dict grid. """
+
+        if isinstance(grid, Board): return grid.copy()
+
+        board = cls(size=int(len(grid) ** 0.5), k=k)
+
+        for position, symbol in grid.items():
+            if symbol is not None: board[position] = symbol
+
+        return board
+
+    def __getitem__(self, position: Position) -> Optional[str]:
+
+        bit = self.topology.bits[position]
+
+        if self.x & bit: return "X"
+        if self.o & bit: return "O"
+
+        return None
+
+    def __setitem__(self, position: Position, symbol: Optional[str]):
+
+        bit = self.topology.bits[position]
+        self.x &= ~bit
+        self.o &= ~bit
+
+        if symbol == "X": self.x |= bit
+        elif symbol == "O": self.o |= bit
+        elif symbol is not None: raise ValueError(f"Unknown symbol {symbol!r}")
+
+    def __iter__(self):
+
+        return iter(self.topology.positions)
+
+    def __len__(self) -> int:
+
+        return self.topology.cells
+
+    def __contains__(self, position) -> bool:
+
+        return position in self.topology.bits
+
+    def __eq__(self, other) -> bool:
+
+        if isinstance(other, Board): return self.x == other.x and self.o == other.o and self.topology is other.topology
+        if isinstance(other, dict): return dict(self.items()) == other
+
+        return NotImplemented
+
+    def __repr__(self) -> str:
+
+        return f"Board(x={self.x:#b}, o={self.o:#b}, size={self.topology.size}, k={self.topology.k})"
+
+    @property
+    def size(self) -> int:
+
+        return self.topology.size
+
+    @property
+    def k(self) -> int:
+
+        return self.topology.k
+
+    def keys(self):
+
+        return list(self.topology.positions)
+
+    def values(self):
+
+        return [self[position] for position in self.topology.positions]
+
+    def items(self):
+
+        return [(position, self[position]) for position in self.topology.positions]
+
+    def get(self, position: Position, default=None):
+
+        return self[position] if position in self.topology.bits else default
+
+    def copy(self) -> "Board":
+
+        board = Board.__new__(Board)
+        board.x, board.o, board.topology = self.x, self.o, self.topology
+
+        return board
+
+    def winner(self) -> Optional[str]:
+        """ Check the line masks for a winner. """
+
+        wins = self.topology.wins
+
+        if wins is not None:
+
+            if wins[self.x]: return "X"
+            if wins[self.o]: return "O"
+
+            return None
+
+        for line in self.topology.lines:
+
+            if self.x & line == line: return "X"
+            if self.o & line == line: return "O"
+
+        return None
+
+    def winnerAt(self, position: Position) -> Optional[str]:
+        """ Check only the lines through the last move for a winner. """
+
+        symbol = self[position]
+        if symbol is None: return None
+
+        marks = self.x if symbol == "X" else self.o
+        if self.topology.wins is not None: return symbol if self.topology.wins[marks] else None
+
+        for line in self.topology.linesThrough[self.topology.indices[position]]:
+            if marks & line == line: return symbol
+
+        return None
+
+    def tie(self) -> bool:
+        """ Check whether every square is filled. """
+
+        return self.x | self.o == self.topology.full
+
+    def canonical(self) -> Tuple[int, int]:
+        """ Reduce a 3x3 board over its 8 rotations and reflections. """
+
+        x, o = self.x, self.o
+
+        return min((symmetry[x], symmetry[o]) for symmetry in Board.symmetries)
+
+def _symmetryTable(transform) -> Tuple[int, ...]:
+    """ Map every 9-bit pattern to its image under a square transform. """
+
+    table = []
+
+    for pattern in range(1 << 9):
+
+        image = 0
+
+        for index, (row, col) in enumerate(Board.positions):
+            if pattern >> index & 1: image |= Board.bits[transform(row, col)]
+
+        table.append(image)
+
+    return tuple(table)
+
+# The base-3 index of every 9-bit pattern, with each set square counted as a 1.
+Board.ternary = tuple(sum(3 ** index for index in range(9) if pattern >> index & 1) for pattern in range(1 << 9))
+
+# The 8 symmetries of the square as lookup tables over 9-bit patterns.
+Board.symmetries = [_symmetryTable(transform) for transform in (
+    lambda row, col: (row, col), lambda row, col: (col, 2 - row),
+    lambda row, col: (2 - row, 2 - col), lambda row, col: (2 - col, row),
+    lambda row, col: (row, 2 - col), lambda row, col: (2 - row, col),
+    lambda row, col: (col, row), lambda row, col: (2 - col, 2 - row))]
+
+class LineCounts:
+    """ X and O counts for every line of a board, kept up to date as marks are made and unmade. """
+
+    def __init__(self, grid: Dict[Position, Optional[str]]):
+
+        board = Board.fromGrid(grid)
+        self.topology = board.topology
+        self.marks = {"X": board.x, "O": board.o}
+        self.counts = {symbol: [(marks & line).bit_count() for line in self.topology.lines] for symbol, marks in self.marks.items()}
+
+    def make(self, position: Position, symbol: str):
+        """ Add a mark, counting it in the lines through its square alone. """
+
+        index = self.topology.indices[position]
+        counts, through = self.counts[symbol], self.topology.lineIndicesThrough[index]
+        self.marks[symbol] |= 1 << index
+
+        for number in range(len(through)): counts[through[number]] += 1
+
+    def unmake(self, position: Position, symbol: str):
+        """ Take back a mark added with make. """
+
+        index = self.topology.indices[position]
+        counts, through = self.counts[symbol], self.topology.lineIndicesThrough[index]
+        self.marks[symbol] &= ~(1 << index)
+
+        for number in range(len(through)): counts[through[number]] -= 1
+
+    def follow(self, board: Board) -> bool:
+        """ Bring the counts to a board of the same topology by unmaking and making the squares that differ. """
+
+        # Between two Medium moves in one game a square or two change; more than that is another game, counted afresh.
+        changed = [(self.marks[symbol] & ~marks, marks & ~self.marks[symbol], symbol) for symbol, marks in (("X", board.x), ("O", board.o))]
+        if sum((removed | added).bit_count() for removed, added, symbol in changed) > 2: return False
+
+        for removed, added, symbol in changed:
+
+            while removed:
+                index = removed.bit_length() - 1
+                self.unmake(self.topology.positions[index], symbol)
+                removed ^= 1 << index
+
+            while added:
+                index = added.bit_length() - 1
+                self.make(self.topology.positions[index], symbol)
+                added ^= 1 << index
+
+        return True
+
+    def missing(self, number: int) -> int:
+        """ Return the empty squares of a line as a bitmask. """
+
+        return self.topology.lines[number] & ~(self.marks["X"] | self.marks["O"])
+
+    def threats(self, symbol: str) -> int:
+        """ Return the squares that would complete a line for a symbol, as a bitmask. """
+
+        mine, theirs = self.counts[symbol], self.counts["O" if symbol == "X" else "X"]
+        need = self.topology.k - 1
+        squares = 0
+
+        for number in range(len(self.topology.lines)):
+            if mine[number] == need and not theirs[number]: squares |= self.missing(number)
+
+        return squares
+
+class TranspositionTable:
+    """ Bounded LRU cache of minimax scores keyed by canonical board and side to move. """
+
+    def __init__(self, maxSize: int = 8192):
+
+        self.maxSize = maxSize
+        self.entries: "OrderedDict[tuple, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+
+        return len(self.entries)
+
+    def key(self, board: Board, toMove: str, ai: str) -> tuple:
+        """ Key a position by its canonical board, the side to move and the scoring side. """
+
+        return (board.canonical(), toMove, ai)
+
+    def get(self, key: tuple, depth: int) -> Optional[int]:
+        """ Look up a score, shifted back to the given search depth. """
+
+        score = self.entries.get(key)
+
+        if score is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        if score > 0: return score - depth
+        if score < 0: return score + depth
+
+        return 0
+
+    def store(self, key: tuple, score: int, depth: int):
+        """ Store a score with the search depth taken out so any depth can reuse it. """
+
+        if score > 0: score += depth
+        elif score < 0: score -= depth
+
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.maxSize: self.entries.popitem(last=False)
+
+    def clear(self):
+        """ Empty the table and reset the counters. """
+
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+class SolvedTable:
+    """ Perfect-play move and score for every reachable position, read from a binary file. """
+
+    # Header followed by two bytes (move index, signed score) per base-3 board and side to move.
+    magic = b"TTT\x01"
+    sides = {"X": 0, "O": 1}
+    noMove = 255
+    defaultPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solved.bin")
+
+    def __init__(self, path: str = defaultPath, useMmap: bool = False):
+
+        self.path = path
+        self.useMmap = useMmap
+        self.data = None
+        self.loaded = False
+
+    def load(self) -> bool:
+        """ Read the table on first use, returning whether it is available. """
+
+        if self.loaded: return self.data is not None
+        self.loaded = True
+
+        if not os.path.exists(self.path): return False
+
+        with open(self.path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.useMmap else file.read()
+
+        if data[:len(SolvedTable.magic)] != SolvedTable.magic or len(data) != len(SolvedTable.magic) + 4 * 3 ** 9:
+            raise ValueError(f"{self.path} is not a solved position table")
+
+        self.data = data
+
+        return True
+
+    def index(board: Board, toMove: str) -> int:
+        """ Find the entry for a board and the side to move. """
+
+        return (Board.ternary[board.x] + 2 * Board.ternary[board.o]) * 2 + SolvedTable.sides[toMove]
+
+    def lookup(self, grid: Dict[Position, Optional[str]], toMove: str) -> Optional[Tuple[Position, int]]:
+        """ Return the best move and its score for the side to move, if the position is solved. """
+
+        if not self.load(): return None
+
+        board = Board.fromGrid(grid)
+        if board.topology is not Board.classic: return None
+
+        offset = len(SolvedTable.magic) + 2 * SolvedTable.index(board, toMove)
+        move, score = self.data[offset], self.data[offset + 1]
+
+        if move == SolvedTable.noMove: return None
+
+        return Board.positions[move], score - 256 if score > 127 else score
+
+    def build(path: str = defaultPath) -> int:
+        """ Solve every reachable position with minimax and write the table, returning the number of entries. """
+
+        entries = bytearray([SolvedTable.noMove, 0]) * (2 * 3 ** 9)
+        table = TranspositionTable(maxSize=1 << 16)
+        seen = set()
+        stack = [(Board(), "X"), (Board(), "O")]
+
+        while stack:
+
+            board, toMove = stack.pop()
+            index = SolvedTable.index(board, toMove)
+
+            if index in seen or board.winner() or board.tie(): continue
+            seen.add(index)
+
+            opponent = "O" if toMove == "X" else "X"
+            move, score = aiHelper.bestMove(board, opponent, toMove, table)
+            entries[2 * index] = Board.positions.index(move)
+            entries[2 * index + 1] = score & 0xFF
+
+            for position, symbol in board.items():
+
+                if symbol is not None: continue
+                child = board.copy()
+                child[position] = toMove
+                stack.append((child, opponent))
+
+        with open(path, "wb") as file:
+            file.write(SolvedTable.magic)
+            file.write(entries)
+
+        return len(seen)
+
+class MoveCache:
+    """ Process-wide LRU of AI replies keyed by board, side to move and level, safe to share between threads. """
+
+    # Levels whose replies depend only on the position; easy is cheaper to pick than to look up and MCTS keeps its own tree.
+    levels = {"medium": 0, "hard": 1}
+    sides = {"X": 0, "O": 1}
+
+    # A saved cache is a header then records (size, k, x, o, side, level, candidate squares) sorted by their key bytes.
+    magic = b"TTTC\x02"
+    record = struct.Struct(">BBQQBBQ")
+    keySize = 20
+    maxCells = 64
+
+    # The symmetry that undoes each of Board.symmetries.
+    inverses = [next(number for number, back in enumerate(Board.symmetries) if all(back[forward[1 << index]] == 1 << index for index in range(9)))
+                for forward in Board.symmetries]
+
+    def __init__(self, maxSize: int = 1 << 16, path: Optional[str] = None):
+
+        self.maxSize = maxSize
+        self.path = path
+        self.entries: "OrderedDict[tuple, int]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.data = None
+        self.count = 0
+
+        if path is not None and os.path.exists(path): self.open(path)
+
+    def __len__(self) -> int:
+
+        return len(self.entries)
+
+    def open(self, path: str):
+        """ Map a saved cache into memory so lookups read it without loading it. """
+
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if data[:len(MoveCache.magic)] != MoveCache.magic or (len(data) - len(MoveCache.magic)) % MoveCache.record.size:
+            raise ValueError(f"{path} is not a move cache")
+
+        self.data = data
+        self.count = (len(data) - len(MoveCache.magic)) // MoveCache.record.size
+
+    def keeps(topology: Topology, level: str, algorithm: str = "solved") -> bool:
+        """ Check whether a level's reply on a board is worth keeping, which a search cut short by its time budget is not. """
+
+        if level == "medium": return True
+
+        # Only the solved algorithm is kept, so minimax and alpha-beta still search and can be compared with it.
+        return level == "hard" and topology is Board.classic and algorithm == "solved"
+
+    def key(board: Board, ai: str, level: str, algorithm: str = "solved") -> Tuple[tuple, int]:
+        """ Key a position by its board, returning the key and the symmetry that reaches it. """
+
+        topology = board.topology
+
+        # Medium's rules take the first fork or block in grid order, so only Hard's kept perfect play is shared between twins.
+        if level == "hard" and MoveCache.keeps(topology, level, algorithm): x, o, number = min((symmetry[board.x], symmetry[board.o], number) for number, symmetry in enumerate(Board.symmetries))
+        else: x, o, number = board.x, board.o, 0
+
+        return (topology.size, topology.k, x, o, MoveCache.sides[ai], MoveCache.levels[level]), number
+
+    def find(self, key: tuple) -> Optional[int]:
+        """ Binary search the saved records for a key. """
+
+        if self.data is None or key[0] * key[0] > MoveCache.maxCells: return None
+
+        target = MoveCache.record.pack(*key, 0)[:MoveCache.keySize]
+        low, high = 0, self.count
+
+        while low < high:
+
+            middle = (low + high) // 2
+            offset = len(MoveCache.magic) + middle * MoveCache.record.size
+            probe = self.data[offset:offset + MoveCache.keySize]
+
+            if probe < target: low = middle + 1
+            elif probe > target: high = middle
+            else: return MoveCache.record.unpack_from(self.data, offset)[-1]
+
+        return None
+
+    def get(self, key: tuple) -> Optional[int]:
+        """ Look up the candidate squares of a position, in memory first and then in the saved file. """
+
+        with self.lock:
+
+            squares = self.entries.get(key)
+
+            if squares is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return squares
+
+        squares = self.find(key)
+
+        if squares is None:
+            with self.lock: self.misses += 1
+            return None
+
+        with self.lock: self.hits += 1
+        self.store(key, squares)
+
+        return squares
+
+    def store(self, key: tuple, squares: int):
+        """ Keep the candidate squares of a position, dropping the least recently used past maxSize. """
+
+        with self.lock:
+
+            self.entries[key] = squares
+            self.entries.move_to_end(key)
+
+            if len(self.entries) > self.maxSize: self.entries.popitem(last=False)
+
+    def move(self, grid: Dict[Position, Optional[str]], ai: str, level: str, candidates) -> Optional[Position]:
+        """ Pick at random from the cached candidates for a position, listing them with candidates(grid) on a miss. """
+
+        board = Board.fromGrid(grid)
+        topology = board.topology
+        key, number = MoveCache.key(board, ai, level)
+        squares = self.get(key)
+
+        if squares is None:
+
+            # Twins are listed on the key's board, so the entry is the same whichever twin the process saw first.
+            moves = candidates(MoveCache.board(key) if number else grid)
+            if moves is None: return None
+
+            squares = 0
+            for position in moves: squares |= topology.bits[position]
+
+            self.store(key, squares)
+
+        if number: squares = Board.symmetries[MoveCache.inverses[number]][squares]
+
+        return MoveCache.pick(topology, squares)
+
+    def board(key: tuple) -> Board:
+        """ Rebuild the board a key was made from, turned by its symmetry. """
+
+        return Board(key[2], key[3], key[0], key[1])
+
+    def pick(topology: Topology, squares: int) -> Optional[Position]:
+        """ Pick at random from candidate squares given as a bitmask. """
+
+        # Listing the squares in grid order keeps the same picks as the uncached levels.
+        moves = [topology.positions[index] for index in range(topology.cells) if squares >> index & 1]
+        if not moves: return None
+
+        return moves[0] if len(moves) == 1 else random.choice(moves)
+
+    def save(self, path: Optional[str] = None) -> int:
+        """ Merge the cache into its file for later processes to open, returning the number of records. """
+
+        path = path or self.path
+        records: Dict[bytes, bytes] = {}
+
+        for offset in range(len(MoveCache.magic), len(MoveCache.magic) + self.count * MoveCache.record.size, MoveCache.record.size):
+            records[self.data[offset:offset + MoveCache.keySize]] = self.data[offset:offset + MoveCache.record.size]
+
+        with self.lock: entries = list(self.entries.items())
+
+        for key, squares in entries:
+
+            if key[0] * key[0] > MoveCache.maxCells: continue
+            record = MoveCache.record.pack(*key, squares)
+            records[record[:MoveCache.keySize]] = record
+
+        # Written beside the old file and swapped in so readers never see half a file.
+        with open(path + ".tmp", "wb") as file:
+            file.write(MoveCache.magic)
+            for key in sorted(records): file.write(records[key])
+
+        os.replace(path + ".tmp", path)
+        self.path = path
+        self.open(path)
+
+        return len(records)
+
+    def clear(self):
+        """ Empty the cache and reset the counters. """
+
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+class Initialise:
+
+    def __init__(self, size: int = 3, k: int = 3):
+
+        self.size = size
+        self.k = k
+        self.grid = self.makeGrid()
+
+    def makeGrid(self) -> Board:
+        """ Make an empty grid. """
+
+        return Board(size=self.size, k=self.k)
+    
+class Result:
+    """ Winner and tie verdicts kept current as moves are made and undone through make and unmake. """
+    
+    def __init__(self, grid: Dict[Position, Optional[str]]):
+        
+        self.grid = grid
+        self.board = grid if isinstance(grid, Board) else Board.fromGrid(grid)
+        
+        # One full check here, then each move only looks at the lines through its square.
+        self.empty = self.board.topology.cells - (self.board.x | self.board.o).bit_count()
+        self.lastWinner = self.board.winner()
+        
+        # Parallel undo stacks, so a move allocates no tuple.
+        self.moves: list = []
+        self.winners: list = []
+
+    def tie(self) -> bool:
+        """ Check the board for a tie. """
+
+        return self.empty == 0
+
+    def winner(self) -> Optional[str]:
+        """ Check the board for a winner. """
+
+        return self.lastWinner
+    
+    def make(self, position: Position, symbol: str):
+        """ Play a move on the grid and update the verdicts from that square alone. """
+        
+        self.moves.append(position)
+        self.winners.append(self.lastWinner)
+        self.board[position] = symbol
+        if self.grid is not self.board: self.grid[position] = symbol
+        self.empty -= 1
+        
+        if self.lastWinner is None: self.lastWinner = self.board.winnerAt(position)
+        
+    def unmake(self):
+        """ Take back the last move made with make. """
+        
+        position, self.lastWinner = self.moves.pop(), self.winners.pop()
+        self.board[position] = None
+        if self.grid is not self.board: self.grid[position] = None
+        self.empty += 1
+
+class BatchResult:
+    """ Winner and tie verdicts for many 3x3 boards at once, using NumPy. """
+
+    # Cells hold 0 for empty, 1 for X and 2 for O, in row-major order.
+    empty, cross, circle = 0, 1, 2
+
+    def pack(boards):
+        """ Pack an (N, 9) array of cells into bitboards holding X in bits 0-8 and O in bits 9-17. """
+
+        import numpy as np
+
+        boards = np.asarray(boards)
+        weights = (1 << np.arange(9)).astype(np.uint32)
+
+        return (boards == BatchResult.cross).astype(np.uint32) @ weights | ((boards == BatchResult.circle).astype(np.uint32) @ weights) << 9
+
+    def evaluate(boards):
+        """ Return winner codes (0 none, 1 X, 2 O) and tie flags for an (N, 9) array or packed bitboards. """
+
+        import numpy as np
+
+        boards = np.asarray(boards)
+        packed = BatchResult.pack(boards) if boards.ndim == 2 else boards.astype(np.uint32, copy=False)
+
+        # One lookup per board and side in the table of patterns that hold a full line.
+        wins = np.frombuffer(Board.classic.wins, dtype=np.bool_)
+        x, o = packed & 0x1FF, packed >> 9 & 0x1FF
+        xWins, oWins = wins[x], wins[o]
+
+        winners = np.where(xWins, BatchResult.cross, np.where(oWins, BatchResult.circle, BatchResult.empty)).astype(np.int8)
+        ties = (x | o) == Board.classic.full
+
+        return winners, ties
+    
+class GameTree:
+    """ Every position reachable from a start, each once, with its verdict and perfect-play value, written as NumPy columns. """
+
+    # Verdicts of a position itself, and values under perfect play: 1 forced X win, 0 draw, -1 forced O win.
+    verdicts = {None: 0, "X": 1, "O": 2, "tie": 3}
+    sides = {"X": 0, "O": 1}
+
+    def __init__(self, grid: Optional[Dict[Position, Optional[str]]] = None, first: str = "X", size: int = 3, k: int = 3, chunkSize: int = 1 << 16):
+
+        self.board = Board.fromGrid(grid, k) if grid is not None else Initialise(size, k).grid
+        if self.board.topology.cells > 64: raise ValueError("Boards of more than 64 squares do not fit the position columns")
+
+        marks = self.board.x.bit_count(), self.board.o.bit_count()
+        self.toMove = first if marks[0] == marks[1] else ("O" if first == "X" else "X")
+        self.chunkSize = chunkSize
+
+        # The hash index: each board seen so far and its packed value and distance.
+        self.index: Dict[Tuple[int, int], int] = {}
+        self.rows: Dict[str, list] = {}
+        self.files: Dict[str, object] = {}
+        self.count = 0
+
+    def dtypes(self) -> Dict[str, str]:
+        """ Return the NumPy type of each column, with boards as small as the board allows. """
+
+        cells = self.board.topology.cells
+        bits = "<u2" if cells <= 16 else "<u4" if cells <= 32 else "<u8"
+
+        return {"x": bits, "o": bits, "toMove": "u1", "verdict": "u1", "value": "i1", "distance": "u1", "depth": "u1"}
+
+    def walk(self, result: Result, toMove: str, depth: int) -> int:
+        """ Visit a position and everything after it, returning its value and plies to the end packed together. """
+
+        board = result.board
+        key = (board.x, board.o)
+        known = self.index.get(key)
+        if known is not None: return known
+
+        winner = result.winner()
+
+        if winner is not None: verdict, value, distance = GameTree.verdicts[winner], 1 if winner == "X" else -1, 0
+        elif result.tie(): verdict, value, distance = GameTree.verdicts["tie"], 0, 0
+        else:
+
+            verdict = GameTree.verdicts[None]
+            opponent = "O" if toMove == "X" else "X"
+            sign = 1 if toMove == "X" else -1
+            best = None
+
+            for index, position in enumerate(board.topology.positions):
+
+                if (board.x | board.o) >> index & 1: continue
+
+                result.make(position, toMove)
+                packed = self.walk(result, opponent, depth + 1)
+                result.unmake()
+
+                # Win soonest, lose latest.
+                childValue, childDistance = (packed & 3) - 1, packed >> 2
+                score = (sign * childValue, -childDistance if sign * childValue > 0 else childDistance)
+
+                if best is None or score > best: best, value, distance = score, childValue, childDistance + 1
+
+        packed = (value + 1) | distance << 2
+        self.index[key] = packed
+        self.emit(key[0], key[1], GameTree.sides[toMove], verdict, value, distance, depth)
+
+        return packed
+
+    def emit(self, *row):
+        """ Add a row, writing the columns out once a chunk fills. """
+
+        for name, item in zip(self.rows, row): self.rows[name].append(item)
+
+        self.count += 1
+        if len(self.rows["x"]) >= self.chunkSize: self.flush()
+
+    def flush(self):
+        """ Append the buffered rows to each column's file. """
+
+        import numpy as np
+
+        for name, dtype in self.dtypes().items():
+
+            np.asarray(self.rows[name], dtype=dtype).tofile(self.files[name])
+            self.rows[name].clear()
+
+    def export(self, directory: str) -> Dict[str, int]:
+        """ Write every position as one .npy file per column and return counts by value. """
+
+        import numpy as np
+
+        os.makedirs(directory, exist_ok=True)
+        dtypes = self.dtypes()
+        self.rows = {name: [] for name in dtypes}
+        self.index.clear()
+        self.count = 0
+
+        # Columns stream to raw files first, since the number of rows is only known at the end.
+        raw = {name: os.path.join(directory, f"{name}.raw") for name in dtypes}
+        self.files = {name: open(path, "wb") for name, path in raw.items()}
+
+        try:
+            result = Result(self.board.copy())
+            self.walk(result, self.toMove, (self.board.x | self.board.o).bit_count())
+            self.flush()
+        finally:
+            for file in self.files.values(): file.close()
+
+        for name, dtype in dtypes.items():
+
+            with open(os.path.join(directory, f"{name}.npy"), "wb") as output, open(raw[name], "rb") as source:
+
+                np.lib.format.write_array_header_1_0(output, {"descr": np.dtype(dtype).str, "fortran_order": False, "shape": (self.count,)})
+                while True:
+                    block = source.read(1 << 20)
+                    if not block: break
+                    output.write(block)
+
+            os.remove(raw[name])
+
+        values = np.load(os.path.join(directory, "value.npy"), mmap_mode="r")
+
+        return {"positions": self.count, "xWins": int((values == 1).sum()), "draws": int((values == 0).sum()), "oWins": int((values == -1).sum())}
+
+    def load(directory: str) -> Dict[str, object]:
+        """ Open each column of an exported tree as a read-only memory map. """
+
+        import numpy as np
+
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ("x", "o", "toMove", "verdict", "value", "distance", "depth")}
+
+class SearchTimeout(Exception):
+    """ Raised inside a search when its time budget runs out. """
+
+class SearchStats:
+    """ What one AI move cost: nodes, deepest ply, cache use and time spent on each root move. """
+    
+    def __init__(self):
+        
+        self.level: Optional[str] = None
+        self.board: Optional[Board] = None
+        self.move: Optional[Position] = None
+        self.elapsed = 0.0
+        self.nodes = 0
+        self.maxDepth = 0
+        self.expanded = 0
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.rootTimes: Dict[Position, float] = {}
+        self.start = 0.0
+        
+    @property
+    def branchingFactor(self) -> float:
+        """ Average children searched below each expanded node. """
+        
+        return (self.nodes - 1) / self.expanded if self.expanded else 0.0
+    
+    @property
+    def nodesPerSecond(self) -> float:
+        
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+        
+    def begin(self, grid: Dict[Position, Optional[str]], level: str, table: Optional[TranspositionTable]):
+        """ Note the position and reset the search counters before a move. """
+        
+        self.level = level
+        self.board = Board.fromGrid(grid)
+        self.rootTimes = {}
+        self.cacheHits, self.cacheMisses = (table.hits, table.misses) if table is not None else (0, 0)
+        aiHelper.nodes = aiHelper.deepest = aiHelper.expanded = 0
+        self.start = time.perf_counter()
+        
+    def finish(self, move: Optional[Position], table: Optional[TranspositionTable]):
+        """ Read the search counters after a move. """
+        
+        self.elapsed = time.perf_counter() - self.start
+        self.move = move
+        self.nodes, self.maxDepth, self.expanded = aiHelper.nodes, aiHelper.deepest, aiHelper.expanded
+        
+        if table is not None: self.cacheHits, self.cacheMisses = table.hits - self.cacheHits, table.misses - self.cacheMisses
+        
+    def asDict(self) -> Dict[str, object]:
+        """ Return the stats as plain values for logging or monitoring. """
+        
+        return {"level": self.level, "x": self.board.x if self.board else 0, "o": self.board.o if self.board else 0, "move": self.move,
+                "elapsed": self.elapsed, "nodes": self.nodes, "nodesPerSecond": self.nodesPerSecond, "maxDepth": self.maxDepth,
+                "branchingFactor": self.branchingFactor, "cacheHits": self.cacheHits, "cacheMisses": self.cacheMisses,
+                "rootTimes": {f"{row},{col}": seconds for (row, col), seconds in self.rootTimes.items()}}
+
+class MCTSNode:
+    """ One position in the search tree and the playouts that went through it. """
+    
+    __slots__ = ("index", "parent", "children", "untried", "x", "o", "mover", "winner", "wins", "visits")
+    
+    def __init__(self, x: int, o: int, mover: str, winner: Optional[str], untried: list, index: int = -1, parent: Optional["MCTSNode"] = None):
+        
+        self.x = x
+        self.o = o
+        
+        # The symbol that moved into this position, whose wins the node counts.
+        self.mover = mover
+        self.winner = winner
+        self.untried = untried
+        self.index = index
+        self.parent = parent
+        self.children: list = []
+        self.wins = 0.0
+        self.visits = 0
+        
+class MCTS:
+    """ Monte Carlo tree search with UCT selection, random playouts and tree reuse between moves. """
+    
+    def __init__(self, iterations: Optional[int] = 2000, exploration: float = 1.4, workers: int = 1):
+        
+        self.iterations = iterations
+        self.exploration = exploration
+        self.workers = workers
+        self.topology: Optional[Topology] = None
+        self.root: Optional[MCTSNode] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        
+        # Playouts carried over from the previous move by the last search.
+        self.reused = 0
+        
+    def untried(self, x: int, o: int) -> list:
+        """ List the squares to expand in a random order, only those next to a mark on big boards. """
+        
+        topology = self.topology
+        filled = x | o
+        
+        if topology.cells <= 25: squares = topology.full & ~filled
+        elif not filled: squares = topology.bits[topology.centre]
+        else:
+            squares = 0
+            for index in range(topology.cells):
+                if filled >> index & 1: squares |= topology.neighbours[index]
+            squares &= ~filled
+        
+        moves = [index for index in range(topology.cells) if squares >> index & 1]
+        random.shuffle(moves)
+        
+        return moves
+    
+    def newRoot(self, board: Board, ai: str) -> MCTSNode:
+        """ Start a tree at a position where the AI is to move. """
+        
+        self.topology = board.topology
+        winner = board.winner() or ("tie" if board.x | board.o == board.topology.full else None)
+        
+        return MCTSNode(board.x, board.o, "O" if ai == "X" else "X", winner, [] if winner else self.untried(board.x, board.o))
+    
+    def rootFor(self, board: Board, ai: str) -> MCTSNode:
+        """ Find the position in the last tree, two moves deep at most, or start a new tree. """
+        
+        self.reused = 0
+        root = self.root
+        
+        if root is not None and self.topology is board.topology:
+            
+            for node in [root] + root.children + [grandchild for child in root.children for grandchild in child.children]:
+                
+                if node.x == board.x and node.o == board.o and node.mover != ai:
+                    
+                    node.parent = None
+                    self.reused = node.visits
+                    return node
+                
+        return self.newRoot(board, ai)
+    
+    def expand(self, node: MCTSNode) -> MCTSNode:
+        """ Add the child for one untried move. """
+        
+        topology = self.topology
+        index = node.untried.pop()
+        symbol = "O" if node.mover == "X" else "X"
+        bit = 1 << index
+        x, o = (node.x | bit, node.o) if symbol == "X" else (node.x, node.o | bit)
+        marks = x if symbol == "X" else o
+        
+        if topology.wins is not None: won = topology.wins[marks]
+        else: won = any(marks & line == line for line in topology.linesThrough[index])
+        
+        winner = symbol if won else ("tie" if x | o == topology.full else None)
+        child = MCTSNode(x, o, symbol, winner, [] if winner else self.untried(x, o), index, node)
+        node.children.append(child)
+        
+        return child
+    
+    def playout(self, node: MCTSNode) -> str:
+        """ Play random moves to the end of the game and return the winner or "tie". """
+        
+        if node.winner is not None: return node.winner
+        
+        topology = self.topology
+        wins, linesThrough = topology.wins, topology.linesThrough
+        x, o = node.x, node.o
+        filled = x | o
+        empty = [index for index in range(topology.cells) if not filled >> index & 1]
+        random.shuffle(empty)
+        symbol = "O" if node.mover == "X" else "X"
+        
+        for index in empty:
+            
+            if symbol == "X":
+                x |= 1 << index
+                marks = x
+            else:
+                o |= 1 << index
+                marks = o
+                
+            if wins is not None:
+                if wins[marks]: return symbol
+            else:
+                for line in linesThrough[index]:
+                    if marks & line == line: return symbol
+                    
+            symbol = "O" if symbol == "X" else "X"
+            
+        return "tie"
+    
+    def search(self, root: MCTSNode, iterations: Optional[int], deadline: Optional[float], cancel: Optional[threading.Event] = None) -> int:
+        """ Run playouts from the root until the iterations or time run out and return how many were run. """
+        
+        exploration = self.exploration
+        log, sqrt = math.log, math.sqrt
+        done = 0
+        
+        while iterations is None or done < iterations:
+            
+            if done & 63 == 63:
+                
+                if (deadline is not None and time.perf_counter() > deadline) or (cancel is not None and cancel.is_set()): break
+                
+                # Stop once no other move can catch up with the most visited one.
+                if iterations is not None and not root.untried and len(root.children) > 1:
+                    first, second = sorted(child.visits for child in root.children)[-1:-3:-1]
+                    if first - second > iterations - done: break
+                    
+            node, depth = root, 0
+            
+            while not node.untried and node.children:
+                
+                scale = exploration * sqrt(log(node.visits))
+                node = max(node.children, key=lambda child: child.wins / child.visits + scale / sqrt(child.visits))
+                depth += 1
+                
+            if node.untried:
+                node = self.expand(node)
+                depth += 1
+                
+            if depth > aiHelper.deepest: aiHelper.deepest = depth
+            winner = self.playout(node)
+            
+            while node is not None:
+                
+                node.visits += 1
+                if winner == node.mover: node.wins += 1
+                elif winner == "tie": node.wins += 0.5
+                node = node.parent
+                
+            done += 1
+            
+        aiHelper.nodes += done
+        
+        return done
+    
+    def rootVisits(x: int, o: int, size: int, k: int, ai: str, iterations: Optional[int], timeBudget: float, seed: int) -> Dict[int, Tuple[int, float]]:
+        """ Search a position in a worker and return the visits and wins of each root move. """
+        
+        random.seed(seed)
+        tree = MCTS(iterations)
+        root = tree.newRoot(Board(x, o, size, k), ai)
+        tree.search(root, iterations, time.perf_counter() + timeBudget)
+        
+        return {child.index: (child.visits, child.wins) for child in root.children}
+    
+    def move(self, grid: Dict[Position, Optional[str]], ai: str, timeBudget: float = 1.0, cancel: Optional[threading.Event] = None) -> Optional[Position]:
+        """ Return the most visited move after searching within the iteration and time budgets. """
+        
+        board = Board.fromGrid(grid)
+        topology = board.topology
+        filled = board.x | board.o
+        aiHelper.nodes = aiHelper.deepest = aiHelper.expanded = 0
+        if filled == topology.full or board.winner(): return None
+        
+        # Take a win or block a loss straight away rather than waiting for the playouts to find it.
+        counts = LineCounts(board)
+        player = "O" if ai == "X" else "X"
+        
+        for symbol in (ai, player):
+            squares = counts.threats(symbol) & ~filled
+            if squares: return topology.positions[squares.bit_length() - 1]
+            
+        deadline = time.perf_counter() + timeBudget
+        
+        if self.workers > 1:
+            
+            if self.executor is None: self.executor = ProcessPoolExecutor(self.workers)
+            
+            totals: Dict[int, int] = {}
+            futures = [self.executor.submit(MCTS.rootVisits, board.x, board.o, topology.size, topology.k, ai, self.iterations, timeBudget, random.getrandbits(64))
+                       for _ in range(self.workers)]
+            
+            for future in futures:
+                for index, (visits, wins) in future.result().items(): totals[index] = totals.get(index, 0) + visits
+                
+            self.root = None
+            return topology.positions[max(totals, key=totals.get)] if totals else AI.easy(board)
+        
+        root = self.root = self.rootFor(board, ai)
+        
+        # A lone candidate needs no playouts.
+        if len(root.untried) + len(root.children) == 1: return topology.positions[(root.untried + [child.index for child in root.children])[0]]
+        
+        self.search(root, self.iterations, deadline, cancel)
+        
+        if not root.children: return AI.easy(board)
+        
+        return topology.positions[max(root.children, key=lambda child: child.visits).index]
+    
+    def close(self):
+        """ Shut down the worker processes of a root-parallel search. """
+        
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+            
+class Strategy:
+    """ An AI level registered with AI: how it picks a move, what that costs and the cheaper level to play instead. """
+    
+    def __init__(self, name: str, move, fallback: Optional[str] = None, anytime: bool = False, seconds=0.0):
+        
+        # move(grid, player, ai, table, algorithm, timeBudget, cancel, stats, deadline) returns a square, None if it gave up,
+        # or raises SearchTimeout if it cannot finish by the time.perf_counter() deadline.
+        self.name = name
+        self.move = move
+        self.fallback = fallback
+        
+        # An anytime level plays the best move found when its time budget runs out, so only time past the budget counts
+        # against a deadline; any other level needs the whole move. seconds is the cost the level declares, a number or a
+        # function of the number of squares: the least an anytime level needs to find any move, or what a move of any
+        # other level takes.
+        self.anytime = anytime
+        self.seconds = seconds
+        
+        # Slowest recent overrun on each number of squares, so a level that missed a deadline is skipped at the next one.
+        self.overruns: Dict[int, float] = {}
+        
+    def needs(self, cells: int) -> float:
+        """ Seconds a move is expected to take beyond its budget, or in all for a level that is not anytime. """
+        
+        declared = self.seconds(cells) if callable(self.seconds) else self.seconds
+        
+        return max(declared, self.overruns.get(cells, 0.0))
+    
+    def observe(self, cells: int, elapsed: float, budget: float):
+        """ Note how long a move took, letting older slow moves fade. """
+        
+        overrun = elapsed - budget if self.anytime else elapsed
+        self.overruns[cells] = max(overrun, self.overruns.get(cells, 0.0) * 0.9)
+        
+    def skip(self, cells: int):
+        """ Let an overrun fade while the level is being skipped, so one slow move does not demote it for good. """
+        
+        if cells in self.overruns: self.overruns[cells] *= 0.9
+        
+class AI:
+    
+    # Callables given the SearchStats of every AI move; searches are only measured when one is added.
+    hooks: list = []
+    
+    # Levels by name, filled by AI.register below the class.
+    strategies: Dict[str, Strategy] = {}
+    
+    def register(strategy: Strategy):
+        """ Add a level, or replace the one with the same name. """
+        
+        AI.strategies[strategy.name] = strategy
+        
+    def strategy(name: str) -> Strategy:
+        
+        if name not in AI.strategies: raise ValueError(f"Unknown difficulty {name!r}")
+        
+        return AI.strategies[name]
+    
+    def addHook(hook):
+        """ Call a function with the SearchStats of every AI move. """
+        
+        AI.hooks.append(hook)
+        
+    def removeHook(hook):
+        
+        AI.hooks.remove(hook)
+        
+    def easy(grid: Dict[Position, Optional[str]]):
+        """ Algorithm that randomly choses an unfilled grid point. """
+        
+        available = [position for position, symbol in grid.items() if symbol is None]
+        
+        return random.choice(available) if available else None
+    
+    def medium(grid: Dict[Position, Optional[str]], player: str, ai: str):
+        """ Algorithm that follows Newell and Simon's program. """
+        
+        candidates = AI.mediumCandidates(grid, player, ai)
+        if not candidates: return None
+        
+        return candidates[0] if len(candidates) == 1 else random.choice(candidates)
+    
+    # Each thread's line counts from its last Medium move, carried to the next board through the squares played since.
+    lineCounts = threading.local()
+    
+    def countsFor(grid: Dict[Position, Optional[str]]) -> LineCounts:
+        """ Return line counts for a board, updating the thread's last ones where only a move or two apart. """
+        
+        board = Board.fromGrid(grid)
+        counts = getattr(AI.lineCounts, "counts", None)
+        
+        if counts is None or counts.topology is not board.topology or not counts.follow(board):
+            counts = AI.lineCounts.counts = LineCounts(board)
+            
+        return counts
+    
+    def mediumCandidates(grid: Dict[Position, Optional[str]], player: str, ai: str) -> list:
+        """ List the squares Newell and Simon's program picks between, one unless the rule is a random pick. """
+    
+        # The line counts are shared by the line and fork checks.
+        counts = AI.countsFor(grid)
+        
+        # 1. Win the game if possible.
+        move = aiHelper.twoInRow(grid, ai, counts)
+        if move: return [move]
+        
+        # 2. Block if possible
+        move = aiHelper.twoInRow(grid, player, counts)
+        if move: return [move]
+        
+        # 3. Try to create a fork
+        move = aiHelper.fork(grid, ai, counts)
+        if move: return [move]
+        
+        # 4. Block a potential fork
+        move = aiHelper.fork(grid, player, counts)
+        if move: return [move]
+        
+        # 5. Play the centre
+        move = aiHelper.centre(grid)
+        if move: return [move]
+            
+        # 6. Play the opposite corner
+        move = aiHelper.oppositeCorner(grid, player)
+        if move: return [move]
+        
+        # 7. Play an empty corner
+        moves = aiHelper.emptyCorners(grid)
+        if moves: return moves
+        
+        # 8. Play an empty side
+        moves = aiHelper.emptySides(grid)
+        if moves: return moves
+        
+        return [position for position, symbol in grid.items() if symbol is None]
+    
+    def mediumSquares(topology: Topology, boards: list, ais: list) -> list:
+        """ Follow the same rules as mediumCandidates for many boards of one topology at once, returning bitmasks of squares. """
+        
+        import numpy
+        
+        count = len(boards)
+        x = numpy.array([board.x for board in boards], dtype=numpy.uint64)
+        o = numpy.array([board.o for board in boards], dtype=numpy.uint64)
+        isX = numpy.array([ai == "X" for ai in ais], dtype=bool)
+        aiMarks, playerMarks = numpy.where(isX, x, o), numpy.where(isX, o, x)
+        empty = ~(x | o) & numpy.uint64(topology.full)
+        
+        # Marks of each side in every line, and each line's empty squares, one row per board.
+        lines = numpy.array(topology.lines, dtype=numpy.uint64)
+        lineEmpty = lines & empty[:, None]
+        aiCounts = numpy.bitwise_count(aiMarks[:, None] & lines)
+        playerCounts = numpy.bitwise_count(playerMarks[:, None] & lines)
+        need = topology.k - 1
+        
+        squares = numpy.zeros(count, dtype=numpy.uint64)
+        decided = numpy.zeros(count, dtype=bool)
+        
+        def rule(found, moves):
+            """ Give the boards the first rule to apply to them picks. """
+            
+            found = found & ~decided
+            squares[found] = moves[found]
+            decided[found] = True
+            
+        def twoInRow(mine, theirs):
+            
+            lineFound = (mine == need) & (theirs == 0)
+            rule(lineFound.any(axis=1), lineEmpty[numpy.arange(count), lineFound.argmax(axis=1)])
+            
+        def fork(mine, theirs):
+            
+            # A new mark turns the lines one short of a threat into threats through their other empty square.
+            threats = numpy.bitwise_or.reduce(numpy.where((mine == need) & (theirs == 0), lineEmpty, 0), axis=1)
+            nearly = numpy.where((mine == need - 1) & (theirs == 0), lineEmpty, 0)
+            forks = numpy.zeros(count, dtype=numpy.uint64)
+            found = numpy.zeros(count, dtype=bool)
+            
+            for index in range(topology.cells):
+                
+                bit = numpy.uint64(1 << index)
+                winMoves = (threats | numpy.bitwise_or.reduce(nearly[:, topology.lineIndicesThrough[index]], axis=1)) & ~bit
+                forked = (empty & bit != 0) & (numpy.bitwise_count(winMoves) == 2) & ~found
+                forks[forked] = bit
+                found |= forked
+                
+            rule(found, forks)
+            
+        twoInRow(aiCounts, playerCounts)
+        twoInRow(playerCounts, aiCounts)
+        fork(aiCounts, playerCounts)
+        fork(playerCounts, aiCounts)
+        
+        centre = numpy.uint64(topology.bits[topology.centre])
+        rule(empty & centre != 0, numpy.full(count, centre))
+        
+        for corner in topology.corners:
+            
+            opposite = numpy.uint64(topology.bits[topology.oppositeCorners[corner]])
+            rule((playerMarks & numpy.uint64(topology.bits[corner]) != 0) & (empty & opposite != 0), numpy.full(count, opposite))
+            
+        corners = numpy.uint64(sum(topology.bits[corner] for corner in set(topology.corners)))
+        sides = numpy.uint64(sum(topology.bits[side] for side in topology.sides))
+        rule(empty & corners != 0, empty & corners)
+        rule(empty & sides != 0, empty & sides)
+        rule(numpy.ones(count, dtype=bool), empty)
+        
+        return [int(value) for value in squares]
+        
+    solved = SolvedTable()
+    
+    def hard(grid: Dict[Position, Optional[str]], player: str, ai: str, table: Optional[TranspositionTable] = None, algorithm: str = "solved", timeBudget: float = 1.0, cancel: Optional[threading.Event] = None, stats: Optional[SearchStats] = None, deadline: Optional[float] = None):
+        """ Algorithm that uses the minimax theorem, raising SearchTimeout if a full search on 3x3 passes the deadline. """
+        
+        # Full minimax never finishes on bigger boards, so they get a depth-limited search.
+        if len(grid) != 9 or (isinstance(grid, Board) and grid.k != 3): algorithm = "deepening"
+        if algorithm == "deepening": return aiHelper.searchMove(grid, player, ai, timeBudget, cancel=cancel, stats=stats)[0]
+        
+        if algorithm == "solved":
+            solvedMove = AI.solved.lookup(grid, ai)
+            if solvedMove: return solvedMove[0]
+            
+        if algorithm == "alphabeta": return aiHelper.alphaBetaMove(grid, player, ai, stats, deadline)[0]
+        
+        return aiHelper.bestMove(grid, player, ai, table, stats, deadline)[0]
+        
+    # One tree kept between calls so each move starts from the playouts of the last.
+    tree = MCTS()
+    
+    # Replies shared by every game in the process; set to None to always search.
+    cache: Optional[MoveCache] = MoveCache()
+    
+    def candidates(grid: Dict[Position, Optional[str]], player: str, ai: str, difficultyLevel: str, table: Optional[TranspositionTable] = None, algorithm: str = "solved", timeBudget: float = 1.0, cancel: Optional[threading.Event] = None, stats: Optional[SearchStats] = None, deadline: Optional[float] = None) -> Optional[list]:
+        """ List the moves a cached level picks between, or None for a cancelled search not worth keeping. """
+        
+        if difficultyLevel == "medium": return AI.mediumCandidates(grid, player, ai)
+        
+        move = AI.hard(grid, player, ai, table, algorithm, timeBudget, cancel, stats, deadline)
+        if cancel is not None and cancel.is_set(): return None
+        
+        return [move] if move else []
+    
+    def mcts(grid: Dict[Position, Optional[str]], ai: str, timeBudget: float = 1.0, cancel: Optional[threading.Event] = None):
+        """ Algorithm that plays random games from the most promising moves and picks the most tried. """
+        
+        return AI.tree.move(grid, ai, timeBudget, cancel)
+        
+    def cached(level: str, grid: Dict[Position, Optional[str]], algorithm: str) -> bool:
+        """ Check whether a level's moves on a board go through the move cache. """
+        
+        return AI.cache is not None and level in MoveCache.levels and MoveCache.keeps(Topology.of(grid), level, algorithm)
+    
+    def play(strategy: Strategy, grid: Dict[Position, Optional[str]], player: str, ai: str, table: Optional[TranspositionTable], algorithm: str, timeBudget: float, cancel: Optional[threading.Event], stats: Optional[SearchStats], deadline: Optional[float] = None):
+        """ Ask one level for its move, through the move cache for the levels it keeps. """
+        
+        if AI.cached(strategy.name, grid, algorithm):
+            return AI.cache.move(grid, ai, strategy.name, lambda board: AI.candidates(board, player, ai, strategy.name, table, algorithm, timeBudget, cancel, stats, deadline))
+        
+        return strategy.move(grid, player, ai, table, algorithm, timeBudget, cancel, stats, deadline)
+    
+    def aiMove(grid: Dict[Position, Optional[str]], player: str, ai: str, difficultyLevel: str, table: Optional[TranspositionTable] = None, algorithm: str = "solved", timeBudget: float = 1.0, cancel: Optional[threading.Event] = None, stats: Optional[SearchStats] = None, deadline: Optional[float] = None):
+        """ Return the move of a level, falling back to cheaper ones when it cannot answer by the time.perf_counter() deadline. """
+        
+        strategy = AI.strategy(difficultyLevel)
+        cells = len(grid)
+        
+        if stats is None and AI.hooks: stats = SearchStats()
+        if stats is not None: stats.begin(grid, difficultyLevel, table)
+        
+        reserved: Optional[str] = None
+        
+        while True:
+            
+            budget, searchDeadline = timeBudget, None
+            
+            if deadline is not None:
+                
+                remaining = deadline - time.perf_counter()
+                
+                # A level that would miss the deadline is only played from the cache, which answers at once.
+                if strategy.fallback is not None and strategy.name != reserved and strategy.needs(cells) > remaining:
+                    
+                    move = AI.cache.move(grid, ai, strategy.name, lambda board: None) if AI.cached(strategy.name, grid, algorithm) else None
+                    if move is not None: break
+                    
+                    strategy.skip(cells)
+                    strategy = AI.strategy(strategy.fallback)
+                    continue
+                
+                # A level is stopped early enough for its fallback to still answer in time, and that fallback is then always played.
+                reserved = strategy.fallback
+                reserve = AI.strategy(strategy.fallback).needs(cells) if strategy.fallback is not None else 0.0
+                searchDeadline = deadline - reserve
+                if strategy.anytime: budget = max(0.0, min(timeBudget, remaining - reserve - strategy.needs(cells)))
+                
+            start = time.perf_counter()
+            
+            try:
+                move = AI.play(strategy, grid, player, ai, table, algorithm, budget, cancel, stats, searchDeadline)
+            except SearchTimeout:
+                move = None
+                
+            strategy.observe(cells, time.perf_counter() - start, budget)
+            
+            # A level that gave up with squares left hands over to its fallback, unless the caller cancelled the move.
+            if move is not None or strategy.fallback is None or (cancel is not None and cancel.is_set()) or None not in grid.values(): break
+            strategy = AI.strategy(strategy.fallback)
+        
+        if stats is not None:
+            stats.finish(move, table)
+            stats.level = strategy.name
+            for hook in AI.hooks: hook(stats)
+        
+        return move
+    
+    def aiMoves(games: list, difficultyLevel: str, table: Optional[TranspositionTable] = None, algorithm: str = "solved", timeBudget: float = 1.0, deadline: Optional[float] = None) -> list:
+        """ Return the moves for many (grid, player, ai) games in the order given, answering each position once. """
+        
+        AI.strategy(difficultyLevel)
+        
+        # Only the cached levels depend on nothing but the position.
+        if difficultyLevel not in MoveCache.levels:
+            return [AI.aiMove(grid, player, ai, difficultyLevel, table, algorithm, timeBudget, deadline=deadline) for grid, player, ai in games]
+        
+        boards = [Board.fromGrid(grid) for grid, player, ai in games]
+        symmetries = []
+        positions: Dict[tuple, Tuple[Board, str, str, int]] = {}
+        
+        # Games share a position through MoveCache.key: Medium only on the exact board, Hard's solved play on 3x3 up to
+        # symmetry, answered on the key's board so the move does not depend on which twin came first.
+        for board, (grid, player, ai) in zip(boards, games):
+            
+            key, number = MoveCache.key(board, ai, difficultyLevel, algorithm)
+            symmetries.append((key, number))
+            if key not in positions: positions[key] = (board, player, ai, number)
+            
+        # Squares of each distinct position turned to its key's board, from the cache where it has them.
+        squares: Dict[tuple, int] = {}
+        
+        for key in positions:
+            if AI.cached(difficultyLevel, positions[key][0], algorithm):
+                
+                found = AI.cache.get(key)
+                if found is not None: squares[key] = found
+                
+        unanswered = [key for key in positions if key not in squares]
+        
+        if difficultyLevel == "medium":
+            
+            byTopology: Dict[Topology, list] = {}
+            
+            for key in unanswered:
+                
+                board, player, ai, number = positions[key]
+                if board.topology.cells <= 64: byTopology.setdefault(board.topology, []).append(key)
+                else: squares[key] = sum(board.topology.bits[position] for position in AI.mediumCandidates(board, player, ai))
+                
+            for topology, keys in byTopology.items():
+                
+                found = AI.mediumSquares(topology, [positions[key][0] for key in keys], [positions[key][2] for key in keys])
+                squares.update(zip(keys, found))
+                
+            for key in unanswered:
+                
+                number = positions[key][3]
+                if number: squares[key] = Board.symmetries[number][squares[key]]
+                if AI.cache is not None: AI.cache.store(key, squares[key])
+                
+        else:
+            
+            # Each search goes through aiMove, which fills the cache and falls back to a cheaper level near the deadline.
+            for key in unanswered:
+                
+                board, player, ai, number = positions[key]
+                if number: board = MoveCache.board(key)
+                move = AI.aiMove(board, player, ai, difficultyLevel, table, algorithm, timeBudget, deadline=deadline)
+                squares[key] = 0 if move is None else board.topology.bits[move]
+                
+        moves = []
+        
+        for board, (key, number) in zip(boards, symmetries):
+            
+            found = Board.symmetries[MoveCache.inverses[number]][squares[key]] if number else squares[key]
+            moves.append(MoveCache.pick(board.topology, found))
+            
+        return moves
+    
+# Costs measured on boards from 3x3 to 19x19; Hard answers 3x3 from the solved table and searches bigger boards in time
+# that grows with the square of the number of squares.
+AI.register(Strategy("easy", lambda grid, player, ai, *search: AI.easy(grid), seconds=lambda cells: 2e-6 * cells))
+AI.register(Strategy("medium", lambda grid, player, ai, *search: AI.medium(grid, player, ai), "easy", seconds=lambda cells: 5e-5 + 2e-8 * cells * cells))
+AI.register(Strategy("hard", AI.hard, "medium", anytime=True, seconds=lambda cells: 0.0005 if cells <= 9 else 0.001 + 6e-7 * cells * cells))
+AI.register(Strategy("mcts", lambda grid, player, ai, table, algorithm, timeBudget, cancel, stats, deadline: AI.mcts(grid, ai, timeBudget, cancel), "medium", anytime=True, seconds=lambda cells: 0.001 + 4e-7 * cells * cells))
+
+class aiHelper:
+    
+    # Nodes visited, deepest ply reached and nodes expanded by the last search.
+    nodes = 0
+    deepest = 0
+    expanded = 0
+    
+    # Bounds shared by every search rather than made at each node.
+    infinity = float("inf")
+    negativeInfinity = - infinity
+    
+    # Centre first, then corners, then sides.
+    moveOrder = [(1, 1), (0, 0), (0, 2), (2, 0), (2, 2), (0, 1), (1, 0), (1, 2), (2, 1)]
+    
+    def twoInRow(grid: Dict[Position, Optional[str]], symbol: str, counts: Optional[LineCounts] = None):
+        """ Find the square that completes a line missing one mark. """
+        
+        counts = counts or LineCounts(grid)
+        mine, theirs = counts.counts[symbol], counts.counts["O" if symbol == "X" else "X"]
+        need = counts.topology.k - 1
+        
+        for number in range(len(mine)):
+            
+            if mine[number] == need and not theirs[number]:
+                return counts.topology.positions[counts.missing(number).bit_length() - 1]
+            
+        return None
+        
+    def fork(grid: Dict[Position, Optional[str]], symbol: str, counts: Optional[LineCounts] = None):
+        """ Find the square for a fork. """
+        
+        counts = counts or LineCounts(grid)
+        topology = counts.topology
+        mine, theirs = counts.counts[symbol], counts.counts["O" if symbol == "X" else "X"]
+        lines, nearly = topology.lines, topology.k - 2
+        taken = counts.marks["X"] | counts.marks["O"]
+        threats = counts.threats(symbol)
+        
+        for index in range(topology.cells):
+            
+            if taken >> index & 1: continue
+            
+            # Only the lines through the new mark can gain a winning square, the other empty square of a line one mark short.
+            winMoves = threats
+            
+            for number in topology.lineIndicesThrough[index]:
+                if mine[number] == nearly and not theirs[number]: winMoves |= lines[number] & ~taken
+                
+            if (winMoves & ~(1 << index)).bit_count() == 2: return topology.positions[index]
+            
+        return None
+    
+    def centre(grid: Dict[Position, Optional[str]]):
+        """ Check the centre. """
+        
+        centre = Topology.of(grid).centre
+        
+        return centre if grid[centre] is None else None
+    
+    def oppositeCorner(grid: Dict[Position, Optional[str]], symbol: str):
+        """ Check the opposite corner. """
+        
+        topology = Topology.of(grid)
+        
+        for corner in topology.corners:
+            
+            opposite = topology.oppositeCorners[corner]
+            if grid[corner] == symbol and grid[opposite] is None: return opposite
+            
+        return None
+    
+    def emptyCorners(grid: Dict[Position, Optional[str]]) -> list:
+        """ List the empty corners. """
+        
+        return [corner for corner in Topology.of(grid).corners if grid[corner] is None]
+    
+    def emptyCorner(grid: Dict[Position, Optional[str]]):
+        """ Check for an empty corner. """
+        
+        emptyCorners = aiHelper.emptyCorners(grid)
+            
+        return random.choice(emptyCorners) if emptyCorners else None
+    
+    def emptySides(grid: Dict[Position, Optional[str]]) -> list:
+        """ List the empty sides. """
+        
+        return [side for side in Topology.of(grid).sides if grid[side] is None]
+    
+    def emptySide(grid: Dict[Position, Optional[str]]):
+        """ Check for an empty side. """
+        
+        emptySides = aiHelper.emptySides(grid)
+            
+        return random.choice(emptySides) if emptySides else None
+    
+    def bestMove(grid: Dict[Position, Optional[str]], player: str, ai: str, table: Optional[TranspositionTable] = None, stats: Optional[SearchStats] = None, deadline: Optional[float] = None) -> Tuple[Optional[Position], int]:
+        """ Search every move with minimax and return the first best one with its score, raising SearchTimeout past the deadline. """
+        
+        # One board and Result serve the whole search, so the nodes below allocate nothing of their own.
+        board = Board.fromGrid(grid)
+        aiHelper.nodes = aiHelper.deepest = aiHelper.expanded = 0
+        bestMove, bestScore = None, aiHelper.negativeInfinity
+        result = Result(board)
+        
+        for position in board.topology.positions:
+            
+            if board[position] is not None: continue
+            if stats is not None: start = time.perf_counter()
+            result.make(position, ai)
+            currentScore = aiHelper.minimax(board, player, ai, False, 0, table, result, deadline)
+            result.unmake()
+            if stats is not None: stats.rootTimes[position] = time.perf_counter() - start
+            
+            if currentScore > bestScore:
+                bestMove, bestScore = position, currentScore
+                
+        return bestMove, bestScore
+    
+    def minimax(grid: Dict[Position, Optional[str]], player: str, ai:str, isMax: bool, depth: int = 0, table: Optional[TranspositionTable] = None, result: Optional[Result] = None, deadline: Optional[float] = None) -> int:
+        """" Find the best move in all possibilities. """
+        
+        aiHelper.nodes += 1
+        if depth >= aiHelper.deepest: aiHelper.deepest = depth + 1
+        if deadline is not None and aiHelper.nodes & 255 == 0 and time.perf_counter() > deadline: raise SearchTimeout
+        if result is None: result = Result(grid)
+        winner = result.winner()
+        
+        if winner == ai: return 10 - depth
+        elif winner == player: return -10 + depth
+        elif result.tie(): return 0
+        
+        if table is not None:
+            
+            key = table.key(result.board, ai if isMax else player, ai)
+            bestScore = table.get(key, depth)
+            if bestScore is not None: return bestScore
+        
+        aiHelper.expanded += 1
+        board = result.board
+        positions = board.topology.positions
+        
+        # Looping over a range rather than the list keeps each node from allocating an iterator the garbage collector tracks.
+        if isMax:
+            
+            bestScore = aiHelper.negativeInfinity
+            
+            for index in range(len(positions)):
+                
+                position = positions[index]
+                if board[position] is not None: continue
+                result.make(position, ai)
+                currentScore = aiHelper.minimax(grid, player, ai, False, depth + 1, table, result, deadline)
+                result.unmake()
+                if currentScore > bestScore: bestScore = currentScore
+                
+        else:
+            
+            bestScore = aiHelper.infinity
+            
+            for index in range(len(positions)):
+                
+                position = positions[index]
+                if board[position] is not None: continue
+                result.make(position, player)
+                currentScore = aiHelper.minimax(grid, player, ai, True, depth + 1, table, result, deadline)
+                result.unmake()
+                if currentScore < bestScore: bestScore = currentScore
+        
+        if table is not None: table.store(key, bestScore, depth)
+        
+        return bestScore
+    
+    def alphaBetaMove(grid: Dict[Position, Optional[str]], player: str, ai: str, stats: Optional[SearchStats] = None, deadline: Optional[float] = None) -> Tuple[Optional[Position], int]:
+        """ Search every move with alpha-beta and return the same move and score as bestMove, raising SearchTimeout past the deadline. """
+        
+        # The search runs on a copy, so a timeout part way through leaves the grid as it was.
+        board = Board.fromGrid(grid)
+        aiHelper.nodes = aiHelper.deepest = aiHelper.expanded = 0
+        bestMove, bestScore = None, aiHelper.negativeInfinity
+        order = Board.positions
+        result = Result(board)
+        
+        for position in aiHelper.moveOrder:
+            
+            if board[position] is not None: continue
+            if stats is not None: start = time.perf_counter()
+            result.make(position, ai)
+            # Search just below the best score so ties come back exact and keep bestMove's choice.
+            currentScore = aiHelper.alphaBeta(board, player, ai, False, 0, bestScore - 1, aiHelper.infinity, result, deadline)
+            result.unmake()
+            if stats is not None: stats.rootTimes[position] = time.perf_counter() - start
+            
+            if currentScore > bestScore or (currentScore == bestScore and order.index(position) < order.index(bestMove)):
+                bestMove, bestScore = position, currentScore
+                
+        return bestMove, bestScore
+    
+    def alphaBeta(grid: Dict[Position, Optional[str]], player: str, ai: str, isMax: bool, depth: int, alpha: float, beta: float, result: Optional[Result] = None, deadline: Optional[float] = None) -> int:
+        """ Minimax with alpha-beta pruning, searching the centre, corners and then sides. """
+        
+        aiHelper.nodes += 1
+        if depth >= aiHelper.deepest: aiHelper.deepest = depth + 1
+        if deadline is not None and aiHelper.nodes & 255 == 0 and time.perf_counter() > deadline: raise SearchTimeout
+        if result is None: result = Result(grid)
+        winner = result.winner()
+        
+        if winner == ai: return 10 - depth
+        elif winner == player: return -10 + depth
+        elif result.tie(): return 0
+        
+        aiHelper.expanded += 1
+        
+        # Nothing scores better than winning on the next move.
+        immediateWin = 10 - depth - 1
+        
+        if isMax:
+            
+            bestScore = aiHelper.negativeInfinity
+            
+            for position in aiHelper.moveOrder:
+                
+                if grid[position] is not None: continue
+                result.make(position, ai)
+                currentScore = aiHelper.alphaBeta(grid, player, ai, False, depth + 1, alpha, beta, result, deadline)
+                result.unmake()
+                bestScore = max(currentScore, bestScore)
+                alpha = max(alpha, bestScore)
+                
+                if alpha >= beta or bestScore == immediateWin: break
+                
+        else:
+            
+            bestScore = aiHelper.infinity
+            
+            for position in aiHelper.moveOrder:
+                
+                if grid[position] is not None: continue
+                result.make(position, player)
+                currentScore = aiHelper.alphaBeta(grid, player, ai, True, depth + 1, alpha, beta, result, deadline)
+                result.unmake()
+                bestScore = min(currentScore, bestScore)
+                beta = min(beta, bestScore)
+                
+                if alpha >= beta or bestScore == - immediateWin: break
+        
+        return bestScore
+    
+    # Scores for bigger boards, where a win outweighs any line count.
+    winScore = 1 << 40
+    
+    def searchMove(grid: Dict[Position, Optional[str]], player: str, ai: str, timeBudget: float = 1.0, maxDepth: Optional[int] = None, cancel: Optional[threading.Event] = None, stats: Optional[SearchStats] = None) -> Tuple[Optional[Position], int]:
+        """ Iteratively deepen a depth-limited alpha-beta search until the time budget runs out or it is cancelled. """
+        
+        board = Board.fromGrid(grid)
+        deadline = time.perf_counter() + timeBudget
+        maxDepth = maxDepth or board.topology.cells - (board.x | board.o).bit_count()
+        aiHelper.nodes = aiHelper.deepest = aiHelper.expanded = 0
+        bestMove, bestScore = None, 0
+        
+        for depth in range(1, maxDepth + 1):
+            
+            try:
+                move, score = aiHelper.searchRoot(board, player, ai, depth, bestMove, deadline if depth > 1 else None, cancel, stats)
+            except SearchTimeout:
+                break
+            
+            bestMove, bestScore = move, score
+            
+            # A forced result will not change with a deeper search.
+            if abs(score) >= aiHelper.winScore - board.topology.cells: break
+            
+        return bestMove, bestScore
+    
+    def searchRoot(board: Board, player: str, ai: str, maxDepth: int, firstMove: Optional[Position], deadline: Optional[float], cancel: Optional[threading.Event] = None, stats: Optional[SearchStats] = None) -> Tuple[Optional[Position], int]:
+        """ Search every candidate move to a fixed depth, trying the previous best move first. """
+        
+        bestMove, bestScore = None, aiHelper.negativeInfinity
+        moves = aiHelper.candidates(board)
+        if firstMove in moves: moves.insert(0, moves.pop(moves.index(firstMove)))
+        
+        for position in moves:
+            
+            if stats is not None: start = time.perf_counter()
+            board[position] = ai
+            currentScore = aiHelper.depthLimited(board, player, ai, False, 1, maxDepth, bestScore, aiHelper.infinity, position, deadline, cancel)
+            board[position] = None
+            if stats is not None: stats.rootTimes[position] = time.perf_counter() - start
+            
+            if currentScore > bestScore:
+                bestMove, bestScore = position, currentScore
+                
+        return bestMove, bestScore
+    
+    def depthLimited(board: Board, player: str, ai: str, isMax: bool, depth: int, maxDepth: int, alpha: float, beta: float, lastMove: Position, deadline: Optional[float], cancel: Optional[threading.Event] = None) -> int:
+        """ Alpha-beta to a fixed depth, scoring the leaves with the line-counting evaluation. """
+        
+        aiHelper.nodes += 1
+        if depth > aiHelper.deepest: aiHelper.deepest = depth
+        
+        if aiHelper.nodes & 255 == 0:
+            if (deadline is not None and time.perf_counter() > deadline) or (cancel is not None and cancel.is_set()): raise SearchTimeout
+        
+        winner = board.winnerAt(lastMove)
+        
+        if winner == ai: return aiHelper.winScore - depth
+        elif winner == player: return - aiHelper.winScore + depth
+        elif board.tie(): return 0
+        elif depth == maxDepth: return aiHelper.evaluate(board, player, ai)
+        
+        aiHelper.expanded += 1
+        
+        symbol = ai if isMax else player
+        bestScore = aiHelper.negativeInfinity if isMax else aiHelper.infinity
+        
+        for position in aiHelper.candidates(board):
+            
+            board[position] = symbol
+            currentScore = aiHelper.depthLimited(board, player, ai, not isMax, depth + 1, maxDepth, alpha, beta, position, deadline, cancel)
+            board[position] = None
+            
+            if isMax:
+                bestScore = max(currentScore, bestScore)
+                alpha = max(alpha, bestScore)
+            else:
+                bestScore = min(currentScore, bestScore)
+                beta = min(beta, bestScore)
+                
+            if alpha >= beta: break
+        
+        return bestScore
+    
+    def candidates(board: Board) -> list:
+        """ List the empty squares next to a mark, nearest the centre first. """
+        
+        topology = board.topology
+        filled = board.x | board.o
+        if not filled: return [topology.centre]
+        
+        moves = [position for index, position in enumerate(topology.positions)
+                 if not filled >> index & 1 and filled & topology.neighbours[index]]
+        
+        middle = (topology.size - 1) / 2
+        moves.sort(key=lambda position: abs(position[0] - middle) + abs(position[1] - middle))
+        
+        return moves
+    
+    def evaluate(board: Board, player: str, ai: str) -> int:
+        """ Score each line open to only one side by how many of its marks it holds. """
+        
+        mine, theirs = (board.x, board.o) if ai == "X" else (board.o, board.x)
+        score = 0
+        
+        for line in board.topology.lines:
+            
+            aiMarks, playerMarks = (mine & line).bit_count(), (theirs & line).bit_count()
+            
+            if aiMarks and not playerMarks: score += 10 ** aiMarks
+            elif playerMarks and not aiMarks: score -= 10 ** playerMarks
+            
+        return score
+        
+class GameRecord:
+    """ The moves of one finished game, stored in about one byte per move. """
+    
+    # Each record is a header (size, k, first symbol, winner, move count) then one square index per move, in one byte
+    # or, on boards of more than 256 squares, two little-endian bytes.
+    magic = b"TTTR\x01"
+    header = struct.Struct("<BBBBH")
+    symbols = {"X": 0, "O": 1}
+    winners = {None: 0, "X": 1, "O": 2}
+    
+    def __init__(self, size: int = 3, k: int = 3):
+        
+        self.size = size
+        self.k = k
+        self.first: Optional[str] = None
+        self.winner: Optional[str] = None
+        self.moves: list = []
+        
+    def add(self, position: Position, symbol: str):
+        """ Record the next move. """
+        
+        if self.first is None: self.first = symbol
+        self.moves.append(position)
+        
+    def encode(self) -> bytes:
+        """ Pack the record into its binary form. """
+        
+        topology = Topology.get(self.size, self.k)
+        header = GameRecord.header.pack(self.size, self.k, GameRecord.symbols[self.first or "X"], GameRecord.winners[self.winner], len(self.moves))
+        
+        indices = [topology.indices[move] for move in self.moves]
+        
+        return header + (bytes(indices) if GameRecord.width(self.size) == 1 else struct.pack(f"<{len(indices)}H", *indices))
+    
+    def width(size: int) -> int:
+        """ Return the bytes each move takes on a board. """
+        
+        return 1 if size * size <= 256 else 2
+    
+    def read(path: str):
+        """ Stream the records in a file one at a time. """
+        
+        symbols = {code: symbol for symbol, code in GameRecord.symbols.items()}
+        winners = {code: winner for winner, code in GameRecord.winners.items()}
+        
+        with open(path, "rb") as file:
+            
+            if file.read(len(GameRecord.magic)) != GameRecord.magic: raise ValueError(f"{path} is not a game record file")
+            
+            while True:
+                
+                header = file.read(GameRecord.header.size)
+                if not header: return
+                if len(header) < GameRecord.header.size: raise ValueError(f"{path} ends part way through a record")
+                
+                size, k, first, winner, count = GameRecord.header.unpack(header)
+                width = GameRecord.width(size)
+                moves = file.read(count * width)
+                if len(moves) < count * width: raise ValueError(f"{path} ends part way through a record")
+                
+                record = GameRecord(size, k)
+                record.first, record.winner = symbols[first], winners[winner]
+                indices = moves if width == 1 else struct.unpack(f"<{count}H", moves)
+                record.moves = [Topology.get(size, k).positions[index] for index in indices]
+                
+                yield record
+                
+    def symbolAt(self, move: int) -> str:
+        """ Return the symbol that played a move, counting from 0. """
+        
+        other = "O" if self.first == "X" else "X"
+        
+        return self.first if move % 2 == 0 else other
+
+class RecordWriter:
+    """ Append game records to a file through an in-memory buffer. """
+    
+    def __init__(self, path: str, bufferSize: int = 1 << 16):
+        
+        self.path = path
+        self.bufferSize = bufferSize
+        self.buffer = bytearray()
+        self.written = 0
+        
+        # A new or empty file starts with the format marker.
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as file: file.write(GameRecord.magic)
+        
+    def write(self, record: GameRecord):
+        """ Queue a record, flushing once the buffer is full. """
+        
+        self.buffer += record.encode()
+        self.written += 1
+        
+        if len(self.buffer) >= self.bufferSize: self.flush()
+        
+    def flush(self):
+        """ Append every queued record to the file in one write. """
+        
+        if not self.buffer: return
+        
+        with open(self.path, "ab") as file: file.write(self.buffer)
+        self.buffer.clear()
+        
+    def close(self):
+        
+        self.flush()
+        
+    def __enter__(self):
+        
+        return self
+    
+    def __exit__(self, *exc):
+        
+        self.close()
+
+class Simulation:
+    """ Play two AI difficulties against each other without a display. """
+    
+    def __init__(self, levels: Tuple[str, str], seed: Optional[int] = None, size: int = 3, k: int = 3, table: Optional[TranspositionTable] = None, timeBudget: float = 1.0, recorder: Optional[RecordWriter] = None):
+        
+        self.levels = {"player1": levels[0], "player2": levels[1]}
+        self.seed = seed
+        self.size = size
+        self.k = k
+        self.table = table if table is not None else TranspositionTable()
+        self.timeBudget = timeBudget
+        self.recorder = recorder
+        self.resultMap = {"X": "cross", "O": "circle"}
+        
+    def playGame(self) -> Tuple[Dict[str, str], Optional[str]]:
+        """ Play one game, returning each player's symbol and the winning symbol. """
+        
+        # Shuffle symbols and the opening player the same way Game does.
+        playerSymbols = ["X", "O"]
+        random.shuffle(playerSymbols)
+        symbols = {"player1": playerSymbols[0], "player2": playerSymbols[1]}
+        
+        players = ["player1", "player2"]
+        random.shuffle(players)
+        
+        grid = Initialise(self.size, self.k).grid
+        result = Result(grid)
+        record = GameRecord(self.size, self.k)
+        
+        while True:
+            
+            for current, opponent in (players, players[::-1]):
+                
+                move = AI.aiMove(grid, symbols[opponent], symbols[current], self.levels[current], self.table, timeBudget=self.timeBudget)
+                result.make(move, symbols[current])
+                record.add(move, symbols[current])
+                
+                winner = result.winner()
+                
+                if winner or result.tie():
+                    
+                    record.winner = winner
+                    if self.recorder is not None: self.recorder.write(record)
+                    
+                    return symbols, winner
+                
+    def run(self, games: int) -> Dict[str, object]:
+        """ Play a number of games and total the wins, losses and ties. """
+        
+        if self.seed is not None: random.seed(self.seed)
+        
+        results: Dict[str, int] = {"player1": 0, "tie": 0, "player2": 0}
+        scoreboard: Dict[str, int] = {"cross": 0, "tie": 0, "circle": 0}
+        
+        for _ in range(games):
+            
+            symbols, winner = self.playGame()
+            
+            if winner is None:
+                results["tie"] += 1
+                scoreboard["tie"] += 1
+                
+            else:
+                results["player1" if symbols["player1"] == winner else "player2"] += 1
+                scoreboard[self.resultMap[winner]] += 1
+        
+        if self.recorder is not None: self.recorder.flush()
+                
+        return {"games": games, "levels": dict(self.levels), "results": results, "scoreboard": scoreboard}
+    
+    def report(summary: Dict[str, object]) -> str:
+        """ Format a run summary as win, loss and draw lines for each player. """
+        
+        results, games = summary["results"], summary["games"]
+        lines = []
+        
+        for player, opponent in (("player1", "player2"), ("player2", "player1")):
+            
+            level = summary["levels"][player]
+            lines.append(f"{player} ({level}): {results[player]} wins, {results[opponent]} losses, {results['tie']} draws ({results[player] / max(games, 1):.1%} won)")
+            
+        lines.append(" | ".join(f"{label.capitalize()} : {wins}" for label, wins in summary["scoreboard"].items()))
+        
+        return "\n".join(lines)
+
+class Tournament:
+    """ Spread simulated games over worker processes and merge their scoreboards. """
+    
+    def __init__(self, levels: Tuple[str, str], games: int, workers: Optional[int] = None, chunkSize: int = 1000, seed: Optional[int] = None, size: int = 3, k: int = 3, timeBudget: float = 1.0, recordPath: Optional[str] = None):
+        
+        self.levels = levels
+        self.games = games
+        self.workers = workers or os.cpu_count() or 1
+        self.chunkSize = chunkSize
+        self.seed = seed
+        self.size = size
+        self.k = k
+        self.timeBudget = timeBudget
+        self.recordPath = recordPath
+        
+    def playChunk(levels: Tuple[str, str], games: int, seed: int, size: int, k: int, timeBudget: float, recordPath: Optional[str] = None) -> Dict[str, object]:
+        """ Play one chunk of games inside a worker and return only its totals. """
+        
+        start = time.perf_counter()
+        recorder = RecordWriter(recordPath) if recordPath else None
+        summary = Simulation(levels, seed, size, k, timeBudget=timeBudget, recorder=recorder).run(games)
+        summary["seconds"] = time.perf_counter() - start
+        summary["worker"] = os.getpid()
+        
+        return summary
+    
+    def run(self) -> Dict[str, object]:
+        """ Play every game and merge the chunks into one summary with per-worker rates. """
+        
+        # Each chunk gets its own seed drawn from the tournament seed.
+        seeds = random.Random(self.seed)
+        chunks = [min(self.chunkSize, self.games - start) for start in range(0, self.games, self.chunkSize)]
+        
+        results: Dict[str, int] = {"player1": 0, "tie": 0, "player2": 0}
+        scoreboard: Dict[str, int] = {"cross": 0, "tie": 0, "circle": 0}
+        workers: Dict[int, Dict[str, float]] = {}
+        start = time.perf_counter()
+        
+        with ProcessPoolExecutor(self.workers) as executor:
+            
+            # Chunks record to their own files so workers never share one.
+            futures = [executor.submit(Tournament.playChunk, self.levels, games, seeds.getrandbits(64), self.size, self.k, self.timeBudget,
+                                       f"{self.recordPath}.{index}" if self.recordPath else None) for index, games in enumerate(chunks)]
+            
+            for future in as_completed(futures):
+                
+                chunk = future.result()
+                
+                for label, wins in chunk["results"].items(): results[label] += wins
+                for label, wins in chunk["scoreboard"].items(): scoreboard[label] += wins
+                
+                worker = workers.setdefault(chunk["worker"], {"games": 0, "seconds": 0.0})
+                worker["games"] += chunk["games"]
+                worker["seconds"] += chunk["seconds"]
+                
+        if self.recordPath: Tournament.mergeRecords(self.recordPath, len(chunks))
+        seconds = time.perf_counter() - start
+        
+        for worker in workers.values(): worker["gamesPerSecond"] = worker["games"] / worker["seconds"] if worker["seconds"] else 0.0
+        
+        return {"games": self.games, "levels": {"player1": self.levels[0], "player2": self.levels[1]}, "results": results, "scoreboard": scoreboard,
+                "workers": workers, "seconds": seconds, "gamesPerSecond": self.games / seconds if seconds else 0.0}
+    
+    def mergeRecords(path: str, chunks: int):
+        """ Append the chunk record files to one record file in chunk order, then remove them. """
+        
+        RecordWriter(path).close()
+        
+        with open(path, "ab") as target:
+            for index in range(chunks):
+                
+                chunkPath = f"{path}.{index}"
+                if not os.path.exists(chunkPath): continue
+                
+                # Every chunk file starts with its own format marker, which the merged file already has.
+                with open(chunkPath, "rb") as source:
+                    if source.read(len(GameRecord.magic)) != GameRecord.magic: raise ValueError(f"{chunkPath} is not a game record file")
+                    shutil.copyfileobj(source, target, 1 << 20)
+                    
+                os.remove(chunkPath)
+    
+    def report(summary: Dict[str, object]) -> str:
+        """ Format a tournament summary with the games per second of each worker. """
+        
+        lines = [Simulation.report(summary)]
+        
+        for pid, worker in sorted(summary["workers"].items()):
+            lines.append(f"worker {pid}: {worker['games']} games, {worker['gamesPerSecond']:.0f} games/s")
+            
+        lines.append(f"total: {summary['games']} games in {summary['seconds']:.2f}s, {summary['gamesPerSecond']:.0f} games/s")
+        
+        return "\n".join(lines)
+
+class Dataset:
+    """ Self-play positions labelled with the best move and its value, written to sharded binary files. """
+
+    # Each shard is a header (size, k) then fixed records: X and O bitboards, side to move, best square and value.
+    magic = b"TTTD\x01"
+    header = struct.Struct("<BB")
+    record = struct.Struct("<QQBBf")
+    dtype = [("x", "<u8"), ("o", "<u8"), ("side", "u1"), ("move", "u1"), ("value", "<f4")]
+
+    # The 8 square symmetries of each board size as index permutations.
+    permutations: Dict[int, list] = {}
+
+    def __init__(self, directory: str, size: int = 3, k: int = 3, workers: Optional[int] = None, shardSize: int = 1 << 20, chunkSize: int = 256,
+                 depth: int = 2, timeBudget: float = 1.0, seed: Optional[int] = None, filterBits: int = 1 << 24):
+
+        if size * size > 64: raise ValueError("Boards of more than 64 squares do not fit a sample record")
+
+        self.directory = directory
+        self.size = size
+        self.k = k
+        self.workers = workers or os.cpu_count() or 1
+        self.shardSize = shardSize
+        self.chunkSize = chunkSize
+        self.depth = depth
+        self.timeBudget = timeBudget
+        self.seed = seed
+
+        # Positions already queued, as a fixed-size hash filter so memory stays flat however many are asked for.
+        self.seen = bytearray(filterBits // 8)
+        self.filterMask = filterBits - 1
+
+        self.shard = None
+        self.shards = 0
+        self.inShard = 0
+        self.written = 0
+
+    def canonical(board: Board) -> Tuple[int, int]:
+        """ Reduce a board over its 8 rotations and reflections. """
+
+        if board.topology is Board.classic: return board.canonical()
+
+        size = board.topology.size
+        permutations = Dataset.permutations.get(size)
+
+        if permutations is None:
+
+            last = size - 1
+            transforms = (lambda row, col: (row, col), lambda row, col: (col, last - row), lambda row, col: (last - row, last - col), lambda row, col: (last - col, row),
+                          lambda row, col: (row, last - col), lambda row, col: (last - row, col), lambda row, col: (col, row), lambda row, col: (last - col, last - row))
+            permutations = Dataset.permutations[size] = [[board.topology.indices[transform(row, col)] for row, col in board.topology.positions] for transform in transforms]
+
+        best = None
+
+        for permutation in permutations:
+
+            images = []
+
+            for marks in (board.x, board.o):
+
+                image = 0
+
+                while marks:
+                    low = marks & -marks
+                    image |= 1 << permutation[low.bit_length() - 1]
+                    marks ^= low
+
+                images.append(image)
+
+            if best is None or images < best: best = images
+
+        return best[0], best[1]
+
+    def isNew(self, key: tuple) -> bool:
+        """ Mark a position as seen, returning whether it was new; rare collisions only drop a sample. """
+
+        bit = hash(key) & self.filterMask
+        byte, mask = bit >> 3, 1 << (bit & 7)
+
+        if self.seen[byte] & mask: return False
+        self.seen[byte] |= mask
+
+        return True
+
+    def positions(self):
+        """ Play easy and medium against each other and yield every new position with a side to move. """
+
+        while True:
+
+            grid = Initialise(self.size, self.k).grid
+            result = Result(grid)
+            symbols = ["X", "O"]
+            random.shuffle(symbols)
+            levels = [random.choice(("easy", "medium")) for _ in symbols]
+            turn = 0
+
+            while not result.winner() and not result.tie():
+
+                ai, player = symbols[turn], symbols[1 - turn]
+                x, o = Dataset.canonical(result.board)
+                key = (x, o, GameRecord.symbols[ai])
+
+                if self.isNew(key): yield key
+                else: yield None
+
+                result.make(AI.aiMove(grid, player, ai, levels[turn]), ai)
+                turn = 1 - turn
+
+    def label(size: int, k: int, positions: list, depth: int, timeBudget: float) -> list:
+        """ Label positions with the best square and its value for the side to move, inside a worker. """
+
+        samples = []
+
+        for x, o, side in positions:
+
+            board = Board(x, o, size, k)
+            ai = "X" if side == 0 else "O"
+            player = "O" if ai == "X" else "X"
+
+            # 3x3 is labelled exactly, as the Hard AI plays it; bigger boards by a depth-limited search.
+            if board.topology is Board.classic:
+                move, score = AI.solved.lookup(board, ai) or aiHelper.bestMove(board, player, ai)
+                value = float((score > 0) - (score < 0))
+            else:
+                move, score = aiHelper.searchMove(board, player, ai, timeBudget, maxDepth=depth)
+                value = math.tanh(score / 10 ** (k - 1))
+
+            samples.append((x, o, side, board.topology.indices[move], value))
+
+        return samples
+
+    def write(self, samples: list):
+        """ Append samples to the current shard, starting a new one when it fills. """
+
+        for sample in samples:
+
+            if self.shard is None or self.inShard == self.shardSize:
+
+                if self.shard is not None: self.shard.close()
+                self.shard = open(os.path.join(self.directory, f"shard-{self.shards:05d}.bin"), "wb")
+                self.shard.write(Dataset.magic + Dataset.header.pack(self.size, self.k))
+                self.shards += 1
+                self.inShard = 0
+
+            self.shard.write(Dataset.record.pack(*sample))
+            self.inShard += 1
+            self.written += 1
+
+    def run(self, samples: int, staleLimit: int = 100000) -> Dict[str, int]:
+        """ Generate, label and write samples until there are enough or staleLimit positions in a row were already seen. """
+
+        os.makedirs(self.directory, exist_ok=True)
+        if self.seed is not None: random.seed(self.seed)
+
+        # At most two chunks per worker wait to be labelled, so generation never runs ahead of the workers.
+        maxPending = 2 * self.workers
+        pending = set()
+        chunk: list = []
+        queued, stale = 0, 0
+        positions = self.positions()
+
+        with ProcessPoolExecutor(self.workers) as executor:
+
+            while self.written < samples:
+
+                while len(pending) < maxPending and queued < samples and stale < staleLimit:
+
+                    key = next(positions)
+
+                    if key is None:
+                        stale += 1
+                        continue
+
+                    stale = 0
+                    chunk.append(key)
+                    queued += 1
+
+                    if len(chunk) == self.chunkSize or queued == samples:
+                        pending.add(executor.submit(Dataset.label, self.size, self.k, chunk, self.depth, self.timeBudget))
+                        chunk = []
+
+                if chunk and len(pending) < maxPending:
+                    pending.add(executor.submit(Dataset.label, self.size, self.k, chunk, self.depth, self.timeBudget))
+                    chunk = []
+
+                if not pending: break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done: self.write(future.result())
+
+        if self.shard is not None: self.shard.close()
+        self.shard = None
+
+        return {"samples": self.written, "shards": self.shards}
+
+    def read(directory: str):
+        """ Stream every sample as (board, side to move, best square, value), one shard at a time. """
+
+        for name in sorted(os.listdir(directory)):
+
+            if not (name.startswith("shard-") and name.endswith(".bin")): continue
+
+            with open(os.path.join(directory, name), "rb") as file:
+
+                if file.read(len(Dataset.magic)) != Dataset.magic: raise ValueError(f"{name} is not a dataset shard")
+                size, k = Dataset.header.unpack(file.read(Dataset.header.size))
+                topology = Topology.get(size, k)
+
+                while True:
+
+                    data = file.read(Dataset.record.size * 4096)
+                    if not data: break
+
+                    for x, o, side, move, value in Dataset.record.iter_unpack(data):
+                        yield Board(x, o, size, k), "X" if side == 0 else "O", topology.positions[move], value
+
+    def batches(directory: str, batchSize: int = 4096):
+        """ Stream the samples as NumPy record arrays of at most batchSize rows. """
+
+        import numpy as np
+
+        dtype = np.dtype(Dataset.dtype)
+
+        for name in sorted(os.listdir(directory)):
+
+            if not (name.startswith("shard-") and name.endswith(".bin")): continue
+
+            with open(os.path.join(directory, name), "rb") as file:
+
+                file.seek(len(Dataset.magic) + Dataset.header.size)
+
+                while True:
+
+                    data = file.read(dtype.itemsize * batchSize)
+                    if not data: break
+                    yield np.frombuffer(data, dtype=dtype)
+
+class Benchmark:
+    """ Time the AI levels and board operations, and compare a run against a saved baseline. """
+    
+    # Fixed positions as moves from the empty board, X moving first.
+    openings = [[], [(1, 1)], [(0, 0)], [(0, 1)], [(0, 0), (1, 1)], [(1, 1), (0, 0)], [(0, 1), (1, 1)],
+                [(0, 0), (1, 1), (2, 2)], [(0, 0), (0, 1), (1, 1)], [(1, 1), (0, 0), (2, 2), (0, 2)], [(0, 0), (1, 1), (2, 2), (0, 2), (2, 0)]]
+    
+    # Metrics where a bigger number is an improvement; every other metric should shrink.
+    higherIsBetter = {"minimaxNodesPerSecond", "resultChecksPerSecond"}
+    
+    # Tail latencies of moves taking microseconds swing by half between identical runs, so they are reported but not
+    # compared against a baseline.
+    ungated = ("P99",)
+    
+    def __init__(self, repeat: int = 200, seed: int = 0, rounds: int = 5):
+        
+        # Every timing is taken once per round and the best kept, since the rest of the machine can only slow a round down.
+        self.repeat = repeat
+        self.seed = seed
+        self.rounds = rounds
+        
+    def positions(self):
+        """ Build each fixed position with the symbols to move and to wait. """
+        
+        for opening in Benchmark.openings:
+            
+            grid = Initialise().grid
+            for turn, position in enumerate(opening): grid[position] = "X" if turn % 2 == 0 else "O"
+            ai = "X" if len(opening) % 2 == 0 else "O"
+            
+            yield grid, "O" if ai == "X" else "X", ai
+            
+    def percentile(samples: list, fraction: float) -> float:
+        """ Return a percentile of some samples. """
+        
+        ordered = sorted(samples)
+        
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    
+    def moveLatency(self, level: str) -> Dict[str, float]:
+        """ Time AI.aiMove on every fixed position, in microseconds. """
+        
+        random.seed(self.seed)
+        table = TranspositionTable()
+        samples = []
+        
+        for _ in range(self.repeat):
+            for grid, player, ai in self.positions():
+                
+                start = time.perf_counter()
+                AI.aiMove(grid, player, ai, level, table)
+                samples.append((time.perf_counter() - start) * 1e6)
+                
+        return {"p50": Benchmark.percentile(samples, 0.5), "p99": Benchmark.percentile(samples, 0.99)}
+    
+    def batchLatency(self, level: str) -> float:
+        """ Time AI.aiMoves answering every fixed position repeat times in one call, in microseconds per move. """
+        
+        random.seed(self.seed)
+        games = list(self.positions()) * self.repeat
+        
+        # The first batch imports NumPy, which is not what is being timed.
+        AI.aiMoves(games[:1], level)
+        start = time.perf_counter()
+        AI.aiMoves(games, level)
+        
+        return (time.perf_counter() - start) * 1e6 / len(games)
+    
+    def minimaxRate(self) -> float:
+        """ Count the minimax nodes searched each second from the fixed positions. """
+        
+        nodes, start = 0, time.perf_counter()
+        
+        for grid, player, ai in list(self.positions())[1:]:
+            aiHelper.bestMove(grid, player, ai)
+            nodes += aiHelper.nodes
+            
+        return nodes / (time.perf_counter() - start)
+    
+    def resultRate(self) -> float:
+        """ Count the winner and tie checks made each second on the fixed positions. """
+        
+        grids = [grid for grid, player, ai in self.positions()]
+        start = time.perf_counter()
+        
+        for _ in range(self.repeat * 10):
+            for grid in grids:
+                result = Result(grid)
+                result.winner()
+                result.tie()
+                
+        return self.repeat * 10 * len(grids) / (time.perf_counter() - start)
+    
+    def allocations(function, calls: int = 1) -> float:
+        """ Count the container objects a call allocates, through the garbage collections they start. """
+        
+        # With the first generation collected whenever two more containers are alive than when it last ran, every
+        # collection marks two allocations. Objects freed before the next is made never start one, so this counts the
+        # allocations that pile up rather than every one, which is the churn that keeps the collector busy.
+        collections = [0]
+        
+        def count(phase, info):
+            
+            if phase == "start": collections[0] += 1
+            
+        threshold = gc.get_threshold()
+        gc.collect()
+        gc.set_threshold(1)
+        gc.callbacks.append(count)
+        
+        try:
+            for _ in range(calls): function()
+        finally:
+            gc.callbacks.remove(count)
+            gc.set_threshold(*threshold)
+            
+        return 2 * collections[0] / calls
+    
+
+    def timings(self) -> Dict[str, float]:
+        """ Take one round of every timing. """
+        
+        results: Dict[str, float] = {}
+        
+        # The levels are timed searching every move, then medium in one batch and once more through an empty move cache.
+        cache, AI.cache = AI.cache, None
+        
+        try:
+            
+            for level in ("easy", "medium", "hard"):
+                for name, value in self.moveLatency(level).items():
+                    results[f"{level}MoveMicroseconds{name.upper()}"] = value
+                    
+            results["batchMediumMoveMicroseconds"] = self.batchLatency("medium")
+            
+            AI.cache = MoveCache()
+            for name, value in self.moveLatency("medium").items(): results[f"cachedMediumMoveMicroseconds{name.upper()}"] = value
+            
+        finally:
+            AI.cache = cache
+                
+        results["minimaxNodesPerSecond"] = self.minimaxRate()
+        results["resultChecksPerSecond"] = self.resultRate()
+        
+        return results
+    
+    def run(self) -> Dict[str, float]:
+        """ Measure every metric. """
+        
+        # Rounds of every timing follow one another, so a short slow spell on the machine spoils one round of each metric
+        # rather than every round of one.
+        results = self.timings()
+        
+        for _ in range(self.rounds - 1):
+            for name, value in self.timings().items():
+                results[name] = max(results[name], value) if name in Benchmark.higherIsBetter else min(results[name], value)
+        
+        grid, player, ai = next(self.positions())
+        random.seed(self.seed)
+        results["mediumAllocationsPerCall"] = Benchmark.allocations(lambda: AI.medium(grid, player, ai), self.repeat)
+        results["minimaxAllocationsPerCall"] = Benchmark.allocations(lambda: aiHelper.bestMove(Board(x=0b000010000), "X", "O"))
+        
+        return results
+    
+    def regressions(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> list:
+        """ List the metrics that got worse than the baseline by more than the threshold fraction. """
+        
+        worse = []
+        
+        for name, value in results.items():
+            
+            if name not in baseline or not baseline[name] or name.endswith(Benchmark.ungated): continue
+            change = (value - baseline[name]) / baseline[name]
+            if name in Benchmark.higherIsBetter: change = - change
+            
+            if change > threshold: worse.append(f"{name}: {baseline[name]:.6g} -> {value:.6g} ({change:+.0%} worse)")
+            
+        return worse
+        